@@ -0,0 +1,81 @@
+# Dispatch error of the real-time simulation drivers, with and without a DeadlineScheduler (see lib/realtime/deadline.py), at different time scales.
+# The dispatch error of an event is how late (in wall-clock time) it is dispatched. Also reports the CPU time used, relative to the wall-clock time, which is what the spinning costs.
+# The Tk driver is not measured (it needs a display), but it schedules its timers like the asyncio driver, with the same (1 ms) resolution.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_deadlines
+
+import asyncio
+import contextlib
+import io
+import random
+import threading
+import time
+
+from lib.controller import Controller
+from lib.realtime.asyncio_event_loop import AsyncioRealTimeSimulation
+from lib.realtime.deadline import DeadlineScheduler
+from lib.realtime.realtime import WallClock
+from lib.realtime.threaded import ThreadedRealTimeSimulation
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, enable_fast_path
+from srcgen.statechart import Statechart
+
+TIME_SCALES = [1, 10, 100]
+EVENTS = 300 # at random moments during DURATION
+DURATION = 1 # seconds (wall-clock time)
+SCHEDULERS = [
+    ("off", lambda: None),
+    ("spin 250 us", lambda: DeadlineScheduler(spin=250000)),
+    ("calibrated", lambda: DeadlineScheduler()),
+]
+
+def setup(time_scale, seed=0):
+    controller = Controller()
+    sc = Statechart()
+    enable_fast_path(sc)
+    sc.timer_service = YakinduTimerServiceAdapter(controller)
+    rng = random.Random(seed)
+    trace = [(timestamp, "scheduler.set_target_x", 0) for timestamp in sorted(rng.randint(0, int(DURATION * time_scale * 1000000000)) for _ in range(EVENTS))]
+    controller.add_inputs(sc, trace)
+    wall_clock = WallClock(time_scale)
+    errors = [] # ns (wall-clock time)
+    controller.input_tracers.append(lambda simtime, event_name, value: errors.append((time.perf_counter_ns() - wall_clock.start_time) - simtime / time_scale))
+    return controller, wall_clock, errors
+
+def run_threaded(time_scale, deadline_scheduler):
+    controller, wall_clock, errors = setup(time_scale)
+    sim = ThreadedRealTimeSimulation(controller, wall_clock, termination_condition=lambda: len(errors) == EVENTS, deadline_scheduler=deadline_scheduler)
+    wall_clock.record_start_time()
+    thread = threading.Thread(target=sim.mainloop)
+    thread.start()
+    thread.join()
+    return errors
+
+def run_asyncio(time_scale, deadline_scheduler):
+    async def main():
+        controller, wall_clock, errors = setup(time_scale)
+        sim = AsyncioRealTimeSimulation(controller, wall_clock, termination_condition=lambda: len(errors) == EVENTS, deadline_scheduler=deadline_scheduler)
+        wall_clock.record_start_time()
+        sim.poke()
+        await sim.terminated()
+        return errors
+    return asyncio.run(main())
+
+DRIVERS = [("threaded", run_threaded), ("asyncio", run_asyncio)]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+if __name__ == "__main__":
+    print(f"{'driver':>8} {'time scale':>10} {'deadline scheduler':>18} {'spin (us)':>9} {'p50 error (us)':>14} {'p99 error (us)':>14} {'max error (us)':>14} {'CPU':>5}")
+    for name, run in DRIVERS:
+        for time_scale in TIME_SCALES:
+            for scheduler_name, make_scheduler in SCHEDULERS:
+                deadline_scheduler = make_scheduler()
+                spin = "" if deadline_scheduler is None else f"{deadline_scheduler.spin / 1000:.0f}"
+                cpu_before, wall_before = time.process_time(), time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()): # "Termination condition satisfied"
+                    errors = run(time_scale, deadline_scheduler)
+                cpu = (time.process_time() - cpu_before) / (time.perf_counter() - wall_before)
+                print(f"{name:>8} {time_scale:>10} {scheduler_name:>18} {spin:>9} {percentile(errors, 50) / 1000:>14.1f} {percentile(errors, 99) / 1000:>14.1f} {max(errors) / 1000:>14.1f} {cpu:>5.0%}")
@@ -0,0 +1,47 @@
+# Measures Controller event queue throughput as a function of queue depth, for every event queue backend.
+#
+# Uses the classic 'hold' model: the queue is pre-filled with N pending events, and every dispatched event schedules one new event in the future, so the queue depth stays N during the measurement.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_event_queue
+
+import random
+import time
+
+from lib.controller import Controller
+from lib.event_queue import HeapEventQueue, CalendarEventQueue
+
+DEPTHS = [10, 100, 1000, 10000, 100000, 1000000]
+DISPATCHES = 100000
+REPEAT = 3 # best of, this benchmark is sensitive to noise (e.g., other processes)
+
+BACKENDS = [
+    ("heap", HeapEventQueue),
+    ("calendar", CalendarEventQueue),
+]
+
+def bench_hold(depth, make_event_queue, dispatches=DISPATCHES, seed=0):
+    rng = random.Random(seed)
+    controller = Controller(event_queue=make_event_queue())
+    remaining = [dispatches]
+
+    def raise_method():
+        remaining[0] -= 1
+        if remaining[0] > 0:
+            controller.add_input_lowlevel(
+                controller.simulated_time + rng.randint(1, 1000000000),
+                raise_method, None, "hold")
+
+    for _ in range(depth):
+        controller.add_input_lowlevel(rng.randint(0, 1000000000), raise_method, None, "hold")
+
+    start = time.perf_counter()
+    while remaining[0] > 0 and controller.have_event():
+        controller.run_until(controller.get_earliest())
+    duration = time.perf_counter() - start
+    return dispatches / duration
+
+if __name__ == "__main__":
+    print(f"{'queue depth':>12}" + "".join(f" {name + ' (events/s)':>22}" for name, _ in BACKENDS))
+    for depth in DEPTHS:
+        print(f"{depth:>12}" + "".join(f" {max(bench_hold(depth, make_event_queue) for _ in range(REPEAT)):>22.0f}" for _, make_event_queue in BACKENDS))
@@ -0,0 +1,43 @@
+# Per-event cost of the generated Statechart code, with and without the fast-path runtime (see enable_fast_path in lib/yakindu_helpers.py).
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_fast_path
+
+import time
+
+from lib.controller import Controller
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, enable_fast_path
+from srcgen.statechart import Statechart
+
+EVENTS = 200000
+
+def make_statechart(fast_path):
+    controller = Controller()
+    sc = Statechart()
+    if fast_path:
+        enable_fast_path(sc)
+    sc.timer_service = YakinduTimerServiceAdapter(controller)
+    sc.enter()
+    return controller, sc
+
+# Calls a raise method directly, isolating the cost of the generated code
+def bench_raise(fast_path):
+    _, sc = make_statechart(fast_path)
+    raise_done_moving = sc.crane_control.raise_done_moving
+    start = time.perf_counter_ns()
+    for _ in range(EVENTS):
+        raise_done_moving()
+    return (time.perf_counter_ns() - start) / EVENTS
+
+# Same events, but dispatched by the Controller
+def bench_controller(fast_path):
+    controller, sc = make_statechart(fast_path)
+    controller.add_inputs(sc, [(i, "crane_control.done_moving", None) for i in range(EVENTS)])
+    start = time.perf_counter_ns()
+    controller.run_until(EVENTS)
+    return (time.perf_counter_ns() - start) / EVENTS
+
+if __name__ == "__main__":
+    print(f"{'':>24} {'generated (ns/event)':>21} {'fast path (ns/event)':>21}")
+    for name, bench in [("raise method", bench_raise), ("controller + raise", bench_controller)]:
+        print(f"{name:>24} {bench(False):>21.0f} {bench(True):>21.0f}")
@@ -0,0 +1,79 @@
+# Responsiveness of EventLoopRealTimeSimulation (here: in an asyncio event loop, which runs the same code as in a tkinter event loop) during a storm of inputs, e.g., from a network bridge, with and without coalescing inputs (see coalesce_window in lib/realtime/event_loop.py).
+# Every input arrives in its own event loop callback, like messages from a bridge. A 'UI' callback wants to run every millisecond: its worst delay is a measure of how responsive the GUI remains.
+# Also checks that every input is dispatched with the timestamp it was given when it arrived, in the order it arrived.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_input_storm
+
+import asyncio
+import contextlib
+import io
+
+from lib.controller import Controller
+from lib.realtime.asyncio_event_loop import AsyncioRealTimeSimulation
+from lib.realtime.realtime import WallClock
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, enable_fast_path
+from srcgen.statechart import Statechart
+
+STORMS = [100, 1000, 10000] # number of inputs
+STREAM_DURATION = 0.1 # seconds: 'stream' storms spread their inputs over this duration, 'burst' storms deliver them all at once
+UI_INTERVAL = 0.001 # seconds
+COALESCE_WINDOWS = [("off", None), ("same tick", 0), ("1 ms", 1000000)]
+REPEAT = 3 # best of
+
+async def storm(inputs, spread, coalesce_window):
+    loop = asyncio.get_running_loop()
+    controller = Controller()
+    sc = Statechart()
+    enable_fast_path(sc)
+    sc.timer_service = YakinduTimerServiceAdapter(controller)
+
+    # Inputs, as they arrive (timestamp, value), and as they are dispatched:
+    added = []
+    dispatched = []
+    add_input = controller.add_input
+    def recording_add_input(sc, event_name, timestamp, value=None):
+        added.append((timestamp, value))
+        return add_input(sc, event_name, timestamp, value)
+    controller.add_input = recording_add_input
+    controller.input_tracers.append(lambda simtime, event_name, value: dispatched.append((simtime, value)))
+
+    run_until_calls = 0
+    run_until = controller.run_until
+    def counting_run_until(until):
+        nonlocal run_until_calls
+        run_until_calls += 1
+        return run_until(until)
+    controller.run_until = counting_run_until
+
+    wall_clock = WallClock()
+    sim = AsyncioRealTimeSimulation(controller, wall_clock, termination_condition=lambda: len(dispatched) == inputs, coalesce_window=coalesce_window)
+
+    ui_delays = []
+    def ui_tick(due):
+        ui_delays.append(loop.time() - due)
+        if not sim.terminated().done():
+            loop.call_at(due + UI_INTERVAL, ui_tick, due + UI_INTERVAL)
+
+    wall_clock.record_start_time()
+    sc.enter()
+    sim.poke()
+    start = loop.time() + 0.05 # leaves time to schedule all inputs
+    loop.call_at(start, ui_tick, start)
+    for i in range(inputs):
+        loop.call_at(start + spread * i / inputs, sim.add_input_now, sc, "scheduler.set_target_x", i)
+    with contextlib.redirect_stdout(io.StringIO()): # "Termination condition satisfied"
+        await sim.terminated()
+    duration = loop.time() - start
+
+    assert dispatched == added, "inputs were not dispatched in the order and with the timestamps they arrived"
+    return duration, run_until_calls, max(ui_delays)
+
+if __name__ == "__main__":
+    print(f"{'inputs':>7} {'arrival':>7} {'coalescing':>10} {'duration (ms)':>14} {'run_until calls':>16} {'max UI delay (ms)':>18}")
+    for inputs in STORMS:
+        for arrival, spread in [("burst", 0), ("stream", STREAM_DURATION)]:
+            for name, coalesce_window in COALESCE_WINDOWS:
+                results = [asyncio.run(storm(inputs, spread, coalesce_window)) for _ in range(REPEAT)]
+                duration, run_until_calls, max_ui_delay = (min(column) for column in zip(*results))
+                print(f"{inputs:>7} {arrival:>7} {name:>10} {duration * 1000:>14.1f} {run_until_calls:>16} {max_ui_delay * 1000:>18.2f}")
@@ -0,0 +1,51 @@
+# Per-event cost of the statechart interpreter (see lib/interpreter.py), compared to the generated code, with and without its fast-path runtime.
+# Also measures how long it takes to load Statechart.ysc.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_interpreter
+
+import time
+
+from lib.controller import Controller
+from lib.interpreter import load_statechart
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, enable_fast_path
+from srcgen.statechart import Statechart
+
+EVENTS = 200000
+REPEAT = 3 # best of
+
+def make_statechart(cls, fast_path):
+    controller = Controller()
+    sc = cls()
+    if fast_path:
+        enable_fast_path(sc)
+    sc.timer_service = YakinduTimerServiceAdapter(controller)
+    sc.enter()
+    return controller, sc
+
+# Calls a raise method directly, isolating the cost of the statechart itself
+def bench_raise(cls, fast_path):
+    _, sc = make_statechart(cls, fast_path)
+    raise_done_moving = sc.crane_control.raise_done_moving
+    start = time.perf_counter_ns()
+    for _ in range(EVENTS):
+        raise_done_moving()
+    return (time.perf_counter_ns() - start) / EVENTS
+
+# Same events, but dispatched by the Controller
+def bench_controller(cls, fast_path):
+    controller, sc = make_statechart(cls, fast_path)
+    controller.add_inputs(sc, [(i, "crane_control.done_moving", None) for i in range(EVENTS)])
+    start = time.perf_counter_ns()
+    controller.run_until(EVENTS)
+    return (time.perf_counter_ns() - start) / EVENTS
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    Interpreted = load_statechart("Statechart.ysc")
+    print(f"Loading Statechart.ysc took {(time.perf_counter() - start) * 1000:.1f} ms")
+    print()
+    print(f"{'':>24} {'generated':>12} {'fast path':>12} {'interpreted':>12}   (ns/event)")
+    for name, bench in [("raise method", bench_raise), ("controller + raise", bench_controller)]:
+        results = [min(bench(cls, fast_path) for _ in range(REPEAT)) for (cls, fast_path) in [(Statechart, False), (Statechart, True), (Interpreted, False)]]
+        print(f"{name:>24} {results[0]:>12.0f} {results[1]:>12.0f} {results[2]:>12.0f}")
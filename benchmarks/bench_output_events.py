@@ -0,0 +1,69 @@
+# Cost of tracing output events: one OutputEventTracer observer per output event (trace_output_events), versus a single multiplexed sink for all output events (see OutputEventMultiplexer in lib/yakindu_helpers.py).
+# Measures both the setup cost (per statechart instance) and the dispatch cost (per output event).
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_output_events
+
+import time
+
+from lib.controller import Controller
+from lib.tracer import Tracer
+from lib.yakindu_helpers import OutputEventTracer, OutputEventRegistry, OutputEventMultiplexer, iter_output_observables, trace_output_events, trace_all_output_events
+from srcgen.statechart import Statechart
+
+INSTANCES = 2000
+EVENTS = 500000
+REPEAT = 5 # best of
+
+# How output events were traced before there was an output event registry: walk dir() of every interface
+def observers_dir(controller, sc, tracer):
+    for iface in ["scheduler", "crane_control"]:
+        for event_name, observable in iter_output_observables(getattr(sc, iface)):
+            observable.subscribe(OutputEventTracer(controller, iface + '.' + event_name, tracer.record_output_event))
+
+def observers_registry(controller, sc, tracer):
+    for iface in ["scheduler", "crane_control"]:
+        trace_output_events(controller, sc, tracer.record_output_event, iface)
+
+def multiplexed_callback(controller, sc, tracer):
+    trace_all_output_events(controller, sc, tracer.record_output_event)
+
+# As in common.setup
+def multiplexed_tracer_sink(controller, sc, tracer):
+    OutputEventMultiplexer.of(sc).subscribe(tracer.output_event_sink(controller, OutputEventRegistry.of(sc).names))
+
+MODES = [
+    ("observers (dir)", observers_dir),
+    ("observers (registry)", observers_registry),
+    ("multiplexed callback", multiplexed_callback),
+    ("multiplexed tracer sink", multiplexed_tracer_sink),
+]
+
+# Returns setup cost per instance (ns)
+def bench_setup(trace):
+    controller = Controller()
+    tracer = Tracer(verbose=False)
+    instances = [Statechart() for _ in range(INSTANCES)]
+    start = time.perf_counter_ns()
+    for sc in instances:
+        trace(controller, sc, tracer)
+    return (time.perf_counter_ns() - start) / INSTANCES
+
+# Returns dispatch cost per output event (ns), as seen by the generated code
+def bench_dispatch(trace):
+    controller = Controller()
+    tracer = Tracer(verbose=False)
+    sc = Statechart()
+    trace(controller, sc, tracer)
+    move_observable = sc.crane_control.move_observable
+    start = time.perf_counter_ns()
+    for i in range(EVENTS):
+        move_observable.next(10)
+    return (time.perf_counter_ns() - start) / EVENTS
+
+if __name__ == "__main__":
+    print(f"{'':>24} {'setup (ns/instance)':>20} {'dispatch (ns/event)':>20}")
+    for name, trace in MODES:
+        setup = min(bench_setup(trace) for _ in range(REPEAT))
+        dispatch = min(bench_dispatch(trace) for _ in range(REPEAT))
+        print(f"{name:>24} {setup:>20.0f} {dispatch:>20.0f}")
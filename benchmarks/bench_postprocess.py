@@ -0,0 +1,51 @@
+# Measures lib.test.postprocess_trace (removal of events without effect) versus the original fixed-point implementation, postprocess_trace_reference.
+# Before measuring, checks on many small random traces that both give exactly the same result.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_postprocess
+
+import random
+import time
+
+from lib.test import postprocess_trace, postprocess_trace_reference
+
+TRACE_LENGTHS = [1000, 3000, 10000, 100000, 1000000]
+REFERENCE_MAX_LENGTH = 10000 # longer traces take minutes
+EVENT_NAMES = ["crane_control.move", "crane_control.hoist", "crane_control.magnet_on", "crane_control.magnet_off", "scheduler.ready", "crane_control.stop_all_movement"]
+IDEMPOTENT = EVENT_NAMES[:5]
+INITIAL = [("crane_control.magnet_off", None), ("crane_control.hoist", 100.0), ("crane_control.move", 0)]
+
+def make_trace(rng, length, max_step, values, sort=True):
+    trace = []
+    timestamp = 0
+    for _ in range(length):
+        timestamp += rng.randint(0, max_step)
+        trace.append((timestamp, rng.choice(EVENT_NAMES), rng.choice(values)))
+    if not sort:
+        rng.shuffle(trace)
+    return trace
+
+def check_equivalence(trials=20000, seed=0):
+    rng = random.Random(seed)
+    for trial in range(trials):
+        # Few distinct timestamps and values, to get many ignorable events:
+        trace = make_trace(rng, rng.randint(0, 20), 1, [None, 0, 0.0, 100, 100.0], sort=trial % 4 != 0)
+        initial = rng.sample(INITIAL, rng.randint(0, len(INITIAL)))
+        expected = postprocess_trace_reference(trace, initial, IDEMPOTENT)
+        actual = postprocess_trace(trace, initial, IDEMPOTENT)
+        assert actual == expected and [type(e[2]) for e in actual] == [type(e[2]) for e in expected], (trace, initial, expected, actual)
+    print(f"postprocess_trace and postprocess_trace_reference agree on {trials} random traces.")
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    check_equivalence()
+    rng = random.Random(0)
+    print(f"{'trace length':>12} {'reference (s)':>14} {'postprocess_trace (s)':>22}")
+    for length in TRACE_LENGTHS:
+        trace = make_trace(rng, length, 3, [None, 0.0, 2.0, 100, 1000.0])
+        reference = f"{timed(postprocess_trace_reference, trace, INITIAL, IDEMPOTENT):>14.3f}" if length <= REFERENCE_MAX_LENGTH else f"{'-':>14}"
+        print(f"{length:>12} {reference} {timed(postprocess_trace, trace, INITIAL, IDEMPOTENT):>22.3f}")
@@ -0,0 +1,59 @@
+# What-if analysis: "what happens if emergency.stop arrives at each of K different instants after a common prefix?"
+# Compares three ways of running the K branches:
+#   - re-running the prefix from t=0 for every branch
+#   - restoring a Snapshot taken at the end of the prefix
+#   - forking the process at the end of the prefix (copy-on-write, Unix only)
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_snapshot
+
+import os
+import time
+
+from common import setup, setup_fake_scheduler, setup_fake_crane_control
+from lib.snapshot import Snapshot, run_forked
+
+PREFIX_END = 5000000000 # 5 s
+BRANCHES = 50
+BRANCH_INTERVAL = 10000000 # 10 ms
+
+# Callbacks must be picklable (no lambdas) to be able to take a Snapshot:
+def quiet(msg):
+    pass
+
+def run_prefix():
+    controller, sc, tracer = setup(print_trace_at_the_end=False)
+    tracer.verbose = False
+    setup_fake_scheduler(controller, sc, move_status_callback=quiet)
+    setup_fake_crane_control(controller, sc, crane_status_callback=quiet)
+    sc.enter()
+    controller.run_until(PREFIX_END)
+    return controller, sc, tracer
+
+def run_branch(controller, sc, tracer, i):
+    controller.add_input(sc, "emergency.stop", PREFIX_END + i * BRANCH_INTERVAL)
+    controller.run_until(float('inf'))
+    return len(tracer.output_events)
+
+def bench_rerun():
+    return [run_branch(*run_prefix(), i) for i in range(BRANCHES)]
+
+def bench_snapshot():
+    snapshot = Snapshot(*run_prefix())
+    return [run_branch(*snapshot.restore(), i) for i in range(BRANCHES)]
+
+def bench_fork():
+    controller, sc, tracer = run_prefix()
+    return [run_forked(lambda: run_branch(controller, sc, tracer, i)) for i in range(BRANCHES)]
+
+if __name__ == "__main__":
+    print(f"{BRANCHES} branches after a prefix of {PREFIX_END / 1000000000} s:")
+    approaches = [("re-run prefix", bench_rerun), ("restore snapshot", bench_snapshot)]
+    if hasattr(os, "fork"):
+        approaches.append(("fork", bench_fork))
+    results = []
+    for name, bench in approaches:
+        start = time.perf_counter()
+        results.append(bench())
+        print(f"  {name:>16}: {time.perf_counter() - start:.3f} s")
+    assert all(result == results[0] for result in results), "approaches give different results!"
@@ -0,0 +1,39 @@
+# Startup time of common.setup(), with the generated code, and with the interpreted Statechart (see lib/interpreter.py) on a cold and a warm model cache.
+# Every measurement runs in a fresh Python process, because that is what a restart is.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_startup
+
+import os
+import subprocess
+import sys
+
+from lib.interpreter import cache_path
+
+REPEAT = 5 # best of
+
+# Measures the time needed to import common.py, and to call setup(), in a new process
+SCRIPT = """
+import time
+start = time.perf_counter()
+from common import setup
+imported = time.perf_counter()
+setup(print_trace_at_the_end=False, interpreted={interpreted})
+print(imported - start, time.perf_counter() - imported)
+"""
+
+# Returns best (import time, setup time), in ms
+def measure(interpreted, cold):
+    results = []
+    for _ in range(REPEAT):
+        if cold and os.path.exists(cache_path("Statechart.ysc")):
+            os.remove(cache_path("Statechart.ysc"))
+        output = subprocess.run([sys.executable, "-c", SCRIPT.format(interpreted=interpreted)], capture_output=True, text=True, check=True).stdout
+        results.append([float(t) * 1000 for t in output.split()])
+    return min(r[0] for r in results), min(r[1] for r in results)
+
+if __name__ == "__main__":
+    print(f"{'':>28} {'import (ms)':>12} {'setup() (ms)':>12}")
+    for name, interpreted, cold in [("generated", False, False), ("interpreted, cold cache", True, True), ("interpreted, warm cache", True, False)]:
+        import_time, setup_time = measure(interpreted, cold)
+        print(f"{name:>28} {import_time:>12.1f} {setup_time:>12.2f}")
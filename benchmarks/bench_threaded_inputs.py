@@ -0,0 +1,88 @@
+# Measures input throughput and injection-to-dispatch latency of ThreadedRealTimeSimulation, as a function of the number of producer threads calling add_input_now at the same time.
+# Compares the inbox-based input path (lib/realtime/threaded.py) with a lock-based one, where producers add their input to the Controller while holding the simulation's lock (as add_input_now used to do), and the simulation thread holds the same lock while running.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_threaded_inputs
+
+import contextlib
+import io
+import threading
+import time
+
+from lib.controller import Controller
+from lib.realtime.realtime import WallClock
+from lib.realtime.threaded import ThreadedRealTimeSimulation
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, enable_fast_path
+from srcgen.statechart import Statechart
+
+PRODUCERS = [1, 2, 4, 16, 64]
+SATURATED_INPUTS = 20000 # in total, sent as fast as possible: measures throughput
+PACED_INPUTS = 200 # per producer, with PACE seconds in between: measures latency when the simulation keeps up
+PACE = 0.001
+
+class LockedThreadedRealTimeSimulation(ThreadedRealTimeSimulation):
+    def mainloop(self):
+        while True:
+            with self.condition:
+                self.controller.run_until(self.wall_clock.time_since_start())
+                if self.termination_condition():
+                    return
+                if self.controller.have_event():
+                    self.condition.wait(self.wall_clock.sleep_duration_until(self.controller.get_earliest()) / 1000000000)
+                else:
+                    self.condition.wait()
+
+    def add_input_now(self, sc, event, value=None):
+        with self.condition:
+            self.controller.add_input(sc, event, timestamp=self.wall_clock.time_since_start(), value=value)
+            self.condition.notify()
+
+# Returns: inputs dispatched per second, list of injection-to-dispatch latencies (ns), list of durations of add_input_now calls (ns)
+def bench(simulation_class, producers, inputs_per_producer, pace=None):
+    total = producers * inputs_per_producer
+    controller = Controller()
+    sc = Statechart()
+    enable_fast_path(sc)
+    sc.timer_service = YakinduTimerServiceAdapter(controller)
+    latencies = []
+    # Every input carries the (wall-clock) time it was made, and is recorded when dispatched:
+    controller.input_tracers.append(lambda simtime, event_name, value: latencies.append(time.perf_counter_ns() - value))
+    wall_clock = WallClock()
+    sim = simulation_class(controller, wall_clock, termination_condition=lambda: len(latencies) == total)
+    call_durations = []
+
+    def produce():
+        durations = []
+        for _ in range(inputs_per_producer):
+            before = time.perf_counter_ns()
+            sim.add_input_now(sc, "scheduler.set_target_x", before)
+            durations.append(time.perf_counter_ns() - before)
+            if pace is not None:
+                time.sleep(pace)
+        call_durations.extend(durations)
+
+    wall_clock.record_start_time()
+    sim_thread = threading.Thread(target=sim.mainloop)
+    threads = [threading.Thread(target=produce) for _ in range(producers)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # "Termination condition satisfied"
+        sim_thread.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sim_thread.join()
+    return total / (time.perf_counter() - start), latencies, call_durations
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+if __name__ == "__main__":
+    print(f"{'':>20} {'saturated':>10} {'paced (every producer: 1 input per ' + str(int(PACE * 1000)) + ' ms)':>54}")
+    print(f"{'producers':>9} {'input path':>10} {'inputs/s':>10} {'p50 latency (us)':>17} {'p99 latency (us)':>17} {'p99 call (us)':>14}")
+    for producers in PRODUCERS:
+        for name, simulation_class in [("locked", LockedThreadedRealTimeSimulation), ("inbox", ThreadedRealTimeSimulation)]:
+            throughput, _, _ = bench(simulation_class, producers, SATURATED_INPUTS // producers)
+            _, latencies, call_durations = bench(simulation_class, producers, PACED_INPUTS, PACE)
+            print(f"{producers:>9} {name:>10} {throughput:>10.0f} {percentile(latencies, 50) / 1000:>17.1f} {percentile(latencies, 99) / 1000:>17.1f} {percentile(call_durations, 99) / 1000:>14.1f}")
@@ -0,0 +1,103 @@
+# Measures the time needed to report a failed test (see lib/test.py): the old difflib.ndiff-based diff of stringified events, versus lib/trace_diff.py.
+# The actual trace is the expected trace with 1% of the events dropped, changed or duplicated.
+# Also checks the diff of unsorted traces that differ in MAX_EDIT_DISTANCE events: it must be a valid and minimal edit script, computed in little memory.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_trace_diff
+
+import random
+import time
+import tracemalloc
+from difflib import ndiff
+
+from lib.trace_diff import TraceDiff, MAX_EDIT_DISTANCE
+
+TRACE_LENGTHS = [1000, 3000, 10000, 100000, 1000000]
+NDIFF_MAX_LENGTH = 10000 # quadratic: longer traces take minutes
+EVENT_NAMES = ["crane_control.move", "crane_control.hoist", "crane_control.magnet_on", "crane_control.magnet_off", "scheduler.ready"]
+
+def make_traces(length, seed=0):
+    rng = random.Random(seed)
+    expected = []
+    timestamp = 0
+    for _ in range(length):
+        timestamp += rng.choice([0, rng.randint(1, 1000000000)])
+        expected.append((timestamp, rng.choice(EVENT_NAMES), rng.choice([None, 0.0, 100, 1000.0])))
+    actual = []
+    for event in expected:
+        r = rng.random()
+        if r < 0.0033:
+            continue # dropped
+        elif r < 0.0066:
+            actual.append((event[0], event[1], 42)) # changed
+        elif r < 0.01:
+            actual.extend([event, event]) # duplicated
+        else:
+            actual.append(event)
+    return expected, actual
+
+# What lib/test.py used to do (without printing)
+def old_diff(expected, actual):
+    lines = []
+    for diffline in ndiff([str(tup)+'\n' for tup in expected], [str(tup)+'\n' for tup in actual], charjunk=None):
+        symbol = diffline[0]
+        if symbol == '?':
+            continue
+        rest = diffline[2:-1]
+        useless_line = (
+               symbol == '-' and rest not in [str(tup) for tup in expected]
+            or symbol == '+' and rest not in [str(tup) for tup in actual]
+        )
+        lines.append((symbol, rest, useless_line))
+    return lines
+
+def new_diff(expected, actual):
+    diff = TraceDiff(expected, actual)
+    summary = diff.summary(expected, actual)
+    clean = {'-': set(expected), '+': set(actual)}
+    return summary, [(symbol, str(event), symbol != ' ' and event not in clean[symbol]) for (symbol, event) in diff.ops]
+
+# Unsorted traces (so they are diffed as a whole), where 'edits' unique events were removed from the expected trace or inserted in the actual trace
+def make_unsorted_traces(length, edits, seed=0):
+    rng = random.Random(seed)
+    expected = [(rng.randint(0, 1000000000), "crane_control.move", i) for i in range(length)]
+    actual = list(expected)
+    for _ in range(edits // 2):
+        del actual[rng.randrange(len(actual))]
+    for i in range(edits - edits // 2):
+        actual.insert(rng.randrange(len(actual) + 1), (rng.randint(0, 1000000000), "scheduler.ready", i))
+    return expected, actual
+
+# Returns duration (s) of the diff
+def check_large_edit_distance(length=10000, edits=MAX_EDIT_DISTANCE):
+    expected, actual = make_unsorted_traces(length, edits)
+    start = time.perf_counter()
+    diff = TraceDiff(expected, actual)
+    duration = time.perf_counter() - start
+    assert [event for (symbol, event) in diff.ops if symbol != '+'] == expected
+    assert [event for (symbol, event) in diff.ops if symbol != '-'] == actual
+    assert diff.missing + diff.unexpected == edits, "diff is not minimal"
+    return duration
+
+# Returns peak memory use (bytes) of the diff. Tracing slows it down a lot, hence fewer edits than check_large_edit_distance.
+def peak_memory(length=10000, edits=MAX_EDIT_DISTANCE // 4):
+    expected, actual = make_unsorted_traces(length, edits)
+    tracemalloc.start()
+    TraceDiff(expected, actual)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    print(f"{'trace length':>12} {'ndiff (s)':>10} {'trace_diff (s)':>15} {'alignment only (s)':>19}")
+    for length in TRACE_LENGTHS:
+        expected, actual = make_traces(length)
+        old = f"{timed(old_diff, expected, actual):>10.3f}" if length <= NDIFF_MAX_LENGTH else f"{'-':>10}"
+        print(f"{length:>12} {old} {timed(new_diff, expected, actual):>15.3f} {timed(TraceDiff, expected, actual):>19.3f}")
+    print(f"unsorted traces, {MAX_EDIT_DISTANCE} differences: {check_large_edit_distance():.1f} s")
+    print(f"unsorted traces, {MAX_EDIT_DISTANCE // 4} differences: peak memory {peak_memory() / 1000000:.1f} MB")
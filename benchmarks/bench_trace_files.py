@@ -0,0 +1,64 @@
+# Compares trace files in JSON-lines format with the binary format of lib/binary_trace.py: file size, writing time, and replaying the file through Controller.add_input_stream.
+# Also checks that both files replay to the same output trace.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_trace_files
+
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_fleet
+from lib.binary_trace import BinaryTraceReader, write_binary_trace
+from lib.tracer import read_trace_jsonl
+
+TRACE_LENGTHS = [10000, 100000, 1000000]
+EVENT_NAMES = ["scheduler.set_target_x", "scheduler.set_target_y", "scheduler.make_move", "crane_control.done_moving"]
+
+def make_trace(length, seed=0):
+    rng = random.Random(seed)
+    timestamps = sorted(rng.randint(0, 1000000000000) for _ in range(length))
+    trace = []
+    for timestamp in timestamps:
+        event_name = rng.choice(EVENT_NAMES)
+        value = rng.randint(0, 9) if event_name.startswith("scheduler.set_target") else None
+        trace.append((timestamp, event_name, value))
+    return trace
+
+def write_jsonl(path, trace):
+    with open(path, 'w') as f:
+        for event in trace:
+            f.write(json.dumps(event) + "\n")
+
+def replay(open_trace, until):
+    # A fleet of one: its tracer does not print every event
+    controller, fleet, tracer = setup_fleet(1, compact_trace=True)
+    sc = fleet[0]
+    start = time.perf_counter()
+    controller.add_input_stream(sc, open_trace())
+    controller.run_until(until)
+    return time.perf_counter() - start, list(tracer.output_events)
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    print(f"{'trace length':>12} {'format':>7} {'size (MB)':>10} {'write (s)':>10} {'replay (s)':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for length in TRACE_LENGTHS:
+            trace = make_trace(length)
+            jsonl_path = os.path.join(directory, "trace.jsonl")
+            binary_path = os.path.join(directory, "trace.bin")
+            write_jsonl_time = timed(write_jsonl, jsonl_path, trace)
+            write_binary_time = timed(write_binary_trace, binary_path, trace)
+            replay_jsonl_time, jsonl_outputs = replay(lambda: read_trace_jsonl(jsonl_path), trace[-1][0])
+            reader = BinaryTraceReader(binary_path)
+            replay_binary_time, binary_outputs = replay(lambda: reader, trace[-1][0])
+            reader.close()
+            assert jsonl_outputs == binary_outputs, "binary trace replays differently"
+            for name, path, write_time, replay_time in [("jsonl", jsonl_path, write_jsonl_time, replay_jsonl_time), ("binary", binary_path, write_binary_time, replay_binary_time)]:
+                print(f"{length:>12} {name:>7} {os.path.getsize(path) / 1e6:>10.2f} {write_time:>10.3f} {replay_time:>11.3f}")
@@ -0,0 +1,35 @@
+# Measures the time it takes to put an input trace in the Controller's event queue: one add_input call per event, versus a single add_inputs call.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_trace_loading
+
+import random
+import time
+
+from common import setup
+
+TRACE_LENGTHS = [1000, 10000, 100000, 1000000]
+EVENT_NAMES = ["scheduler.set_target_x", "scheduler.set_target_y", "scheduler.make_move", "crane_control.done_moving"]
+
+def make_trace(length, seed=0):
+    rng = random.Random(seed)
+    return [(rng.randint(0, 1000000000000), rng.choice(EVENT_NAMES), None) for _ in range(length)]
+
+def bench_add_input(trace):
+    controller, sc, _ = setup(print_trace_at_the_end=False)
+    start = time.perf_counter()
+    for (timestamp, event_name, value) in trace:
+        controller.add_input(sc, event_name, timestamp, value)
+    return time.perf_counter() - start
+
+def bench_add_inputs(trace):
+    controller, sc, _ = setup(print_trace_at_the_end=False)
+    start = time.perf_counter()
+    controller.add_inputs(sc, trace)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    print(f"{'trace length':>12} {'add_input (s)':>14} {'add_inputs (s)':>15}")
+    for length in TRACE_LENGTHS:
+        trace = make_trace(length)
+        print(f"{length:>12} {bench_add_input(trace):>14.3f} {bench_add_inputs(trace):>15.3f}")
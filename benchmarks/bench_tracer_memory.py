@@ -0,0 +1,47 @@
+# Memory usage and recording cost of the list-based Tracer versus the column-wise CompactTracer (see lib/tracer.py), for a long trace.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_tracer_memory
+
+import time
+import tracemalloc
+
+from lib.tracer import Tracer, CompactTracer
+
+EVENTS = 1000000
+NAMES = ["scheduler.set_target_x", "scheduler.set_target_y", "scheduler.make_move", "crane_control.done_moving", "__timer0"]
+VALUES = [1000.0, 2.0, None, None, 0]
+
+# Returns (bytes per recorded event, ns per event)
+def bench(tracer):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter_ns()
+    record_input_event = tracer.record_input_event
+    for i in range(EVENTS):
+        record_input_event(i * 1000, NAMES[i % 5], VALUES[i % 5])
+    duration = time.perf_counter_ns() - start
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(tracer.input_events), duration / EVENTS
+
+# Timestamps of different types (e.g., floats in real-time simulation, ints beyond 64 bits) must be read back as recorded
+def check_mixed_timestamps():
+    timestamps = [0, 2**53 + 1, 1500.5, 2**63 - 1, 2**70, 3000]
+    tracer, compact_tracer = Tracer(verbose=False), CompactTracer()
+    for t in [tracer, compact_tracer]:
+        for timestamp in timestamps:
+            t.record_input_event(timestamp, NAMES[0], VALUES[0])
+    assert compact_tracer.input_events == tracer.input_events
+    assert [type(timestamp) for (timestamp, _, _) in compact_tracer.input_events] == [type(timestamp) for timestamp in timestamps]
+
+if __name__ == "__main__":
+    tracer, compact_tracer = Tracer(verbose=False), CompactTracer()
+    print(f"{'':>16} {'bytes/event':>12} {'ns/event':>12}")
+    for name, t in [("Tracer", tracer), ("CompactTracer", compact_tracer)]:
+        memory, duration = bench(t)
+        print(f"{name:>16} {memory:>12.1f} {duration:>12.0f}")
+    start = time.perf_counter()
+    assert compact_tracer.input_events == tracer.input_events
+    print(f"Conversion back to a list of tuples: {time.perf_counter() - start:.3f} s (lossless)")
+    check_mixed_timestamps()
@@ -1,11 +1,15 @@
 import sys
+import os
 import math
+import functools
 
 from lib.controller import Controller, pretty_time
 from lib.realtime.realtime import WallClock
-from lib.tracer import Tracer, format_trace_as_python_code
-from lib.yakindu_helpers import YakinduTimerServiceAdapter, trace_output_events
+from lib.tracer import Tracer, FleetTracer, CompactTracer, CompactFleetTracer, StreamingTracer, format_trace_as_python_code
+from lib.fleet import Fleet
+from lib.yakindu_helpers import YakinduTimerServiceAdapter, OutputEventRegistry, OutputEventMultiplexer, enable_fast_path
 from lib.yakindu.rx import Observer
+from lib.interpreter import load_statechart
 from srcgen.statechart import Statechart # generated code
 
 import atexit
@@ -29,6 +33,10 @@ class FakeScheduler(Observer):
         self.next_move_idx = 0
         self.move_status_callback = move_status_callback
         self.terminate = False
+        # resolve input events only once:
+        self.set_target_x = controller.input_event_id(sc, 'scheduler.set_target_x')
+        self.set_target_y = controller.input_event_id(sc, 'scheduler.set_target_y')
+        self.make_move = controller.input_event_id(sc, 'scheduler.make_move')
 
     def done(self):
         return self.next_move_idx == len(MOVES)
@@ -49,9 +57,9 @@ class FakeScheduler(Observer):
             #  (input:500ms-timer after making a move) -> (output:ready) -> (input:set_target_x,set_target_y,make_move) -> (output:move)
             # However, only the events (input:set_target_x,...) are recorded, and the 500ms-timer event will occur AFTER those events, making the Statechart not respond to the scheduler.
             # By introducing a small delay between (output:ready) and (input:set_target_x,...), the correct ordering between (input:500ms-timer) and (input:set_target_x,...) is restored.
-            self.controller.add_input_relative(self.sc, 'scheduler.set_target_x', value=x, time_offset=time_offset)
-            self.controller.add_input_relative(self.sc, 'scheduler.set_target_y', value=y, time_offset=time_offset)
-            self.controller.add_input_relative(self.sc, 'scheduler.make_move', time_offset=time_offset)
+            self.controller.add_input_id_relative(self.sc, self.set_target_x, value=x, time_offset=time_offset)
+            self.controller.add_input_id_relative(self.sc, self.set_target_y, value=y, time_offset=time_offset)
+            self.controller.add_input_id_relative(self.sc, self.make_move, time_offset=time_offset)
             self.move_status_callback(f"making move {self.next_move_idx}")
             self.next_move_idx += 1
         else:
@@ -72,6 +80,7 @@ class FakeInertia(Observer):
         self.dir = dir
         self.current_pos = initial_pos
         self.crane_status_callback = crane_status_callback
+        self.done_moving = controller.input_event_id(sc, 'crane_control.done_moving')
 
     # respond to 'move' or 'hoist' event:
     def next(self, value=None):
@@ -81,7 +90,7 @@ class FakeInertia(Observer):
         self.crane_status_callback(msg) # display message (in terminal or GUI)
 
         # we already add the 'done_moving'-event to the Controller's event queue, but with a timestamp in the future:
-        self.controller.add_input_relative(self.sc, 'crane_control.done_moving', time_offset=fake_time_to_move) # s to ns
+        self.controller.add_input_id_relative(self.sc, self.done_moving, time_offset=fake_time_to_move) # s to ns
         self.current_pos = value
 
 class FakeStopper(Observer):
@@ -89,11 +98,12 @@ class FakeStopper(Observer):
         self.controller = controller
         self.sc = sc
         self.crane_status_callback = crane_status_callback
+        self.done_moving = controller.input_event_id(sc, 'crane_control.done_moving')
 
     def next(self, value=None):
         msg = f"stopping all movement..."
         self.crane_status_callback(msg)
-        self.controller.add_input_relative(self.sc, 'crane_control.done_moving', time_offset=500000000) # 500 ms
+        self.controller.add_input_id_relative(self.sc, self.done_moving, time_offset=500000000) # 500 ms
 
 def setup_fake_crane_control(controller, sc, crane_status_callback):
     sc.crane_control.move_observable.subscribe(FakeInertia(controller, sc, "horizontally", 0.0, crane_status_callback))
@@ -113,19 +123,40 @@ def setup_wall_clock():
     return wall_clock
 
 
+# The Statechart class interpreted directly from the model, without code generation (see lib/interpreter.py). Loaded only once.
+@functools.cache
+def interpreted_statechart():
+    return load_statechart(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Statechart.ysc"))
+
+def statechart_class(interpreted):
+    return interpreted_statechart() if interpreted else Statechart
+
+
 # Setup controller, statechart, and event handlers
-def setup(print_trace_at_the_end=True):
+# fast_path: use the (unlocked) fast-path runtime for the generated code, see lib/yakindu_helpers.py
+# interpreted: run Statechart.ysc directly, instead of the generated code in srcgen/
+# compact_trace: record the trace in compact column-wise storage (see lib/tracer.py), for long runs
+# trace_file: instead of keeping the trace in memory (and printing it at the end), write it to <trace_file>.input.jsonl and <trace_file>.output.jsonl while the simulation runs (see StreamingTracer in lib/tracer.py). Survives crashes.
+# binary_trace: with trace_file, write .bin files (see lib/binary_trace.py) instead of JSON lines
+def setup(print_trace_at_the_end=True, fast_path=False, interpreted=False, compact_trace=False, trace_file=None, binary_trace=False):
     controller = Controller()
-    sc = Statechart()
+    sc = statechart_class(interpreted)()
+    if fast_path:
+        enable_fast_path(sc)
     sc.timer_service = YakinduTimerServiceAdapter(controller)
 
     # Record input and output events
-    tracer = Tracer()
+    if trace_file is not None:
+        tracer = StreamingTracer(trace_file, binary=binary_trace, verbose=True)
+        atexit.register(tracer.close)
+    elif compact_trace:
+        tracer = CompactTracer(verbose=True)
+    else:
+        tracer = Tracer()
     controller.input_tracers.append(tracer.record_input_event)
-    trace_output_events(controller, sc, iface="scheduler", callback=tracer.record_output_event)
-    trace_output_events(controller, sc, iface="crane_control", callback=tracer.record_output_event)
+    OutputEventMultiplexer.of(sc).subscribe(tracer.output_event_sink(controller, OutputEventRegistry.of(sc).names))
 
-    if print_trace_at_the_end:
+    if print_trace_at_the_end and trace_file is None:
         def print_trace():
             print("End of simulation. Full I/O trace:")
             print("{")
@@ -141,3 +172,16 @@ def setup(print_trace_at_the_end=True):
         tracer,
         # sched.done, # termination condition: stop when all moves were made
     )
+
+
+# Setup controller, and a fleet of 'size' statecharts sharing that controller
+def setup_fleet(size, trace=True, fast_path=True, interpreted=False, compact_trace=False):
+    controller = Controller()
+    tracer = None
+    if trace:
+        tracer = CompactFleetTracer() if compact_trace else FleetTracer()
+    fleet = Fleet(controller, statechart_class(interpreted), size, tracer, fast_path)
+    return (
+        controller, fleet,
+        tracer,
+    )
@@ -0,0 +1,222 @@
+# Compact binary trace file format, for traces that are too large for Python source code or JSON.
+#
+# File layout (all integers little-endian):
+#   header   48 bytes: magic (8 bytes), version (uint16), flags (uint16), record size (uint32), record count (uint64), offset of first record (uint64), offset of event name table (uint64), number of event names (uint64)
+#   records  fixed-width, see RECORD below
+#   names    event name table: for every event name, its length (uint16) followed by its UTF-8 encoding. Event IDs in the records index this table.
+# The event name table normally comes after the records, so that a trace can be written while it is being recorded, without knowing all event names in advance.
+# Alternatively, space for the event name table can be reserved between the header and the records (see BinaryTraceWriter).
+#
+# Every record is 24 bytes: timestamp (8 bytes), value (8 bytes), event ID (uint32), kind (uint8), 3 bytes padding.
+# The kind tells how to interpret the timestamp and value:
+#   bits 0-1: value type: 0 = None, 1 = int64, 2 = float64, 3 = bool
+#   bit 2:    timestamp type: 0 = int64, 1 = float64
+# Other value types (e.g., strings) are not supported, use JSON lines instead (see lib/tracer.py).
+
+import mmap
+import struct
+
+from lib.controller import InputEventRegistry, QueueEntry
+
+MAGIC = b'SCTRACE\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQQQQ')
+RECORD_SIZE = 24
+# kind -> struct to (un)pack (timestamp, value, event ID, kind) of a record
+RECORD = [struct.Struct('<' + ('d' if kind & 4 else 'q') + ('d' if kind & 3 == 2 else 'q') + 'IB3x') for kind in range(8)]
+NAME_LENGTH = struct.Struct('<H')
+
+class BinaryTraceWriter:
+    # Typical usage:
+    #   with BinaryTraceWriter(path) as writer:
+    #       writer.write_many(trace)
+    # names_capacity: number of bytes reserved for the event name table, right after the header. As long as the event names fit, flush() leaves a complete, readable trace file behind, even if the process gets killed afterwards. Otherwise, the file is only readable after close().
+    def __init__(self, path, buffer_size=1 << 20, names_capacity=0):
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.names = [] # event ID -> event name
+        self.ids = {} # event name -> event ID
+        self.count = 0
+        self.names_capacity = names_capacity
+        self.records_offset = HEADER.size + names_capacity
+        self.file.write(bytes(self.records_offset)) # header is written when flushing or closing
+        if names_capacity:
+            self.flush()
+
+    def write(self, timestamp, event_name, value=None):
+        try:
+            event_id = self.ids[event_name]
+        except KeyError:
+            event_id = self.ids[event_name] = len(self.names)
+            self.names.append(event_name)
+        self.file.write(pack_record(timestamp, event_id, value))
+        self.count += 1
+
+    def write_many(self, trace):
+        for (timestamp, event_name, value) in trace:
+            self.write(timestamp, event_name, value)
+
+    def flush(self):
+        # Records must be written before the header that counts them:
+        self.file.flush()
+        names = encode_names(self.names)
+        if len(names) <= self.names_capacity:
+            position = self.file.tell()
+            self.file.seek(HEADER.size)
+            self.file.write(names)
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0, RECORD_SIZE, self.count, self.records_offset, HEADER.size, len(self.names)))
+            self.file.seek(position)
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        names = encode_names(self.names)
+        if len(names) <= self.names_capacity:
+            self.flush()
+        else:
+            names_offset = self.records_offset + self.count * RECORD_SIZE
+            self.file.write(names)
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0, RECORD_SIZE, self.count, self.records_offset, names_offset, len(self.names)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def encode_names(names):
+    encoded = [name.encode() for name in names]
+    return b''.join(NAME_LENGTH.pack(len(e)) + e for e in encoded)
+
+def pack_record(timestamp, event_id, value):
+    if value is None:
+        kind, value = 0, 0
+    elif value is True or value is False:
+        kind = 3
+    elif isinstance(value, int):
+        kind = 1
+    elif isinstance(value, float):
+        kind = 2
+    else:
+        raise ValueError(f"Cannot store value {value!r} of type {type(value).__name__} in a binary trace")
+    if not isinstance(timestamp, int):
+        kind |= 4
+    return RECORD[kind].pack(timestamp, value, event_id, kind)
+
+# Writes an entire trace, i.e., an iterable of (timestamp, event_name, value)-tuples
+def write_binary_trace(path, trace):
+    with BinaryTraceWriter(path) as writer:
+        writer.write_many(trace)
+
+
+# Memory-maps a binary trace file: opening a trace of any size is instantaneous, and records are only decoded when they are needed.
+# Iterating gives (timestamp, event_name, value)-tuples. To replay a trace, pass the reader to Controller.add_input_stream, which then reads the records directly, without creating any tuples.
+class BinaryTraceReader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, record_size, self.count, self.records_offset, names_offset, num_names) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a binary trace file: {path}")
+        if version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"Unsupported binary trace version {version} (record size {record_size}): {path}")
+        self.names = [] # event ID -> event name
+        offset = names_offset
+        for _ in range(num_names):
+            (length,) = NAME_LENGTH.unpack_from(self.mm, offset)
+            self.names.append(self.mm[offset + 2:offset + 2 + length].decode())
+            offset += 2 + length
+
+    # Returns (timestamp, event ID, value) of the i-th record
+    def record(self, i):
+        offset = self.records_offset + i * RECORD_SIZE
+        kind = self.mm[offset + 20]
+        timestamp, value, event_id, _ = RECORD[kind].unpack_from(self.mm, offset)
+        return timestamp, event_id, decode_value(kind, value)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        timestamp, event_id, value = self.record(i)
+        return (timestamp, self.names[event_id], value)
+
+    def __iter__(self):
+        names = self.names
+        for i in range(self.count):
+            timestamp, event_id, value = self.record(i)
+            yield (timestamp, names[event_id], value)
+
+    # Called by Controller.add_input_stream
+    def input_stream(self, controller, sc, sequence_number):
+        return BinaryInputStream(controller, sc, self, sequence_number)
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def decode_value(kind, value):
+    value_type = kind & 3
+    if value_type == 0:
+        return None
+    if value_type == 3:
+        return bool(value)
+    return value
+
+
+# Like lib.controller.InputStream, but reading records straight from a BinaryTraceReader.
+# Event names are resolved once per event ID in the file, instead of once per event.
+class BinaryInputStream:
+    def __init__(self, controller, sc, reader, sequence_number):
+        self.controller = controller
+        self.reader = reader
+        table = controller.raise_table(sc)
+        event_ids = InputEventRegistry.of(sc).ids
+        # event ID in the file -> (raise method, event name)
+        self.raise_methods = []
+        for name in reader.names:
+            try:
+                self.raise_methods.append(table[event_ids[name]])
+            except KeyError:
+                # only an error if the event actually occurs (see pull)
+                self.raise_methods.append((None, name))
+        self.type_name = type(sc).__name__
+        self.sequence_number = sequence_number
+        self.next_index = 0
+        self.raise_method = None
+        self.last_timestamp = None
+        self.done = False
+
+    def pull(self):
+        if self.next_index == self.reader.count:
+            self.done = True
+            return
+        timestamp, event_id, value = self.reader.record(self.next_index)
+        self.next_index += 1
+        raise_method, event_name = self.raise_methods[event_id]
+        if raise_method is None:
+            raise ValueError(f"Unknown input event '{event_name}' for {self.type_name}")
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError(f"Input stream not sorted by timestamp: event '{event_name}' at {timestamp} comes after {self.last_timestamp}")
+        self.raise_method = raise_method
+        self.last_timestamp = timestamp
+        e = QueueEntry(timestamp, self.raise_and_pull, value, event_name)
+        self.controller.event_queue.push((timestamp, self.sequence_number, e))
+
+    def raise_and_pull(self, value=None):
+        raise_method = self.raise_method
+        self.pull()
+        if value is None:
+            raise_method()
+        else:
+            raise_method(value)
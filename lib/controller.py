@@ -1,7 +1,12 @@
 # Author: Joeri Exelmans
 
+import gc
+
+from lib.event_queue import HeapEventQueue
+from lib.stats import ControllerStats, run_until_instrumented
+
 class QueueEntry:
-    __slots__ = ('timestamp', 'raise_method', 'value', 'canceled', 'event_name') # For MAXIMUM performance :)
+    __slots__ = ('timestamp', 'raise_method', 'value', 'canceled', 'queued', 'tombstone', 'event_name') # For MAXIMUM performance :)
 
     def __init__(self, timestamp, raise_method, value, event_name):
         self.timestamp = timestamp
@@ -9,70 +14,296 @@ class QueueEntry:
         self.value = value
         self.event_name = event_name # name of the event - only needed for debugging
         self.canceled = False
+        self.queued = True # False as soon as the entry has left the event queue
+        self.tombstone = False # True if counted in Controller.tombstones (i.e., canceled with Controller.cancel, rather than by setting 'canceled')
 
     def __repr__(self):
         return f"({self.timestamp}, {self.event_name}, {self.value})"
 
+# Registry of the input events of a statechart class, built once per class.
+# Maps every input event name (e.g., 'scheduler.set_target_x') to a compact integer ID, so that events can be scheduled without any string manipulation.
+# Input events are discovered through the naming convention of the generated code: a public 'raise_<event>' method, either on the statechart itself or on one of its interface objects.
+class InputEventRegistry:
+    registries = {} # statechart class -> InputEventRegistry
+
+    # Get the registry of the class of 'sc', creating it the first time
+    @staticmethod
+    def of(sc):
+        try:
+            return InputEventRegistry.registries[type(sc)]
+        except KeyError:
+            registry = InputEventRegistry.registries[type(sc)] = InputEventRegistry(sc)
+            return registry
+
+    def __init__(self, sc):
+        self.names = [] # event ID -> event name
+        self.paths = [] # event ID -> (interface attribute name or None, raise method name)
+        self.ids = {} # event name -> event ID
+        for method_name in raise_method_names(sc):
+            self.register(None, method_name)
+        for interface, obj in vars(sc).items():
+            if not interface.startswith('_'):
+                for method_name in raise_method_names(obj):
+                    self.register(interface, method_name)
+
+    def register(self, interface, method_name):
+        short_event_name = method_name[len('raise_'):]
+        event_name = short_event_name if interface is None else interface + '.' + short_event_name
+        self.ids[event_name] = len(self.names)
+        self.names.append(event_name)
+        self.paths.append((interface, method_name))
+
+    # Resolve all events for a particular statechart instance
+    # Returns list: event ID -> (bound raise method, event name)
+    def bind(self, sc):
+        return [
+            (getattr(sc if interface is None else getattr(sc, interface), method_name), event_name)
+                for (interface, method_name), event_name in zip(self.paths, self.names)
+        ]
+
+def raise_method_names(obj):
+    # 'raise_time_event' is how the generated code raises timed events - they are not part of any interface
+    return [attr for attr in dir(type(obj)) if attr.startswith('raise_') and attr != 'raise_time_event']
+
+# An input trace that is read lazily, while the simulation runs (see Controller.add_input_stream).
+# Only the next event of the stream is in the event queue at any time. When it is dispatched, the next event is read from the stream.
+class InputStream:
+    def __init__(self, controller, sc, trace, sequence_number):
+        self.controller = controller
+        self.iterator = iter(trace)
+        self.raise_table = controller.raise_table(sc)
+        self.event_ids = InputEventRegistry.of(sc).ids
+        self.type_name = type(sc).__name__
+        # All events of this stream share the same sequence number.
+        # This never causes two entries to be compared, because only one event of the stream is in the queue at a time.
+        self.sequence_number = sequence_number
+        self.raise_method = None # raise method of the event in the queue
+        self.last_timestamp = None
+        self.done = False
+
+    def pull(self):
+        try:
+            (timestamp, event_name, value) = next(self.iterator)
+        except StopIteration:
+            self.done = True
+            return
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError(f"Input stream not sorted by timestamp: event '{event_name}' at {timestamp} comes after {self.last_timestamp}")
+        try:
+            self.raise_method, _ = self.raise_table[self.event_ids[event_name]]
+        except KeyError:
+            raise ValueError(f"Unknown input event '{event_name}' for {self.type_name}") from None
+        self.last_timestamp = timestamp
+        e = QueueEntry(timestamp, self.raise_and_pull, value, event_name)
+        self.controller.event_queue.push((timestamp, self.sequence_number, e))
+
+    def raise_and_pull(self, value=None):
+        raise_method = self.raise_method
+        self.pull()
+        if value is None:
+            raise_method()
+        else:
+            raise_method(value)
+
+
 # The main primitive for discrete event simulation.
 # An event queue / event loop, using virtualized (simulated) time, independent of wall clock time.
 class Controller:
-    def __init__(self):
-        self.event_queue = []
+    # compaction_threshold: minimal number of canceled entries ('tombstones') in the queue before the queue is compacted (canceled entries removed). Compaction only happens when tombstones also make up at least half of the queue, so its O(n) cost is amortized over the cancelations that caused it.
+    # event_queue: one of the backends in lib/event_queue.py. Defaults to a binary heap, which is also the fastest backend in benchmarks/bench_event_queue.py at every queue depth measured (up to 10^6 pending events). A CalendarEventQueue is only roughly on par at 10^5 to 10^6 pending events.
+    def __init__(self, compaction_threshold=1024, event_queue=None):
+        # Holds (timestamp, sequence_number, QueueEntry)-tuples.
+        # The sequence number breaks ties between equally-timestamped events.
+        self.event_queue = HeapEventQueue() if event_queue is None else event_queue
+        # Incremented for every 'normal' insertion: equally-timestamped events are dispatched in FIFO order.
+        self.next_sequence_number = 0
+        # Decremented for every 'interrupt' insertion: such events go before all equally-timestamped events already in the queue.
+        self.next_interrupt_sequence_number = -1
         self.simulated_time = 0
         self.input_tracers = []
 
+        # statechart instance -> list: event ID -> (bound raise method, event name)
+        self.raise_tables = {}
+
+        self.compaction_threshold = compaction_threshold
+        self.tombstones = 0 # number of canceled entries still in the queue
+        self.compactions = 0 # number of times the queue was compacted
+        self.canceled_skipped = 0 # number of canceled entries removed from the queue without being dispatched
+
+        # ControllerStats, only when enabled:
+        self.stats = None
+
     # timestamp = absolute value, in simulated time (since beginning of simulation)
     def add_input(self, sc, event_name, timestamp, value=None):
-        if '.' in event_name:
-            interface, short_event_name = event_name.split('.')
-            raise_method = getattr(getattr(sc, interface), 'raise_' + short_event_name)
-        else:
-            raise_method = getattr(sc, 'raise_' + event_name)
-        self.add_input_lowlevel(timestamp, raise_method, value, event_name)
+        return self.add_input_id(sc, self.input_event_id(sc, event_name), timestamp, value)
 
     # time_offset = relative to current simulated time
     def add_input_relative(self, sc, event_name, time_offset=0, value=None):
         timestamp = self.simulated_time + time_offset
         return self.add_input(sc, event_name, timestamp, value)
 
+    # Look up the ID of an input event (e.g., 'scheduler.set_target_x') once, and then use add_input_id(_relative) on the hot path
+    def input_event_id(self, sc, event_name):
+        try:
+            return InputEventRegistry.of(sc).ids[event_name]
+        except KeyError:
+            raise ValueError(f"Unknown input event '{event_name}' for {type(sc).__name__}") from None
+
+    # Bulk version of add_input: puts an entire input trace, i.e., an iterable of (timestamp, event_name, value)-tuples, in the event queue at once.
+    # Much faster than calling add_input for every event. Equally-timestamped events keep their order.
+    # All event names are checked before anything is added to the queue.
+    def add_inputs(self, sc, trace):
+        table = self.raise_table(sc)
+        event_ids = InputEventRegistry.of(sc).ids
+        sequence_number = self.next_sequence_number
+        tuples = []
+        # Creating millions of objects triggers the cyclic garbage collector over and over again, while none of these objects can be garbage:
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for (timestamp, event_name, value) in trace:
+                try:
+                    raise_method, _ = table[event_ids[event_name]]
+                except KeyError:
+                    raise ValueError(f"Unknown input event '{event_name}' for {type(sc).__name__}") from None
+                tuples.append((timestamp, sequence_number, QueueEntry(timestamp, raise_method, value, event_name)))
+                sequence_number += 1
+            self.event_queue.push_many(tuples)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self.next_sequence_number = sequence_number
+        return [tup[2] for tup in tuples]
+
+    # Attach an input trace, i.e., an iterable of (timestamp, event_name, value)-tuples sorted by timestamp, that is consumed lazily by run_until.
+    # Memory usage is independent of the length of the trace, so this is the way to replay very large recorded traces (e.g., from lib.tracer.read_trace_jsonl).
+    # The events are ordered exactly as if the entire trace had been passed to add_inputs at this point.
+    # Events of a stream cannot be canceled.
+    # A trace may provide its own stream, through a method input_stream(controller, sc, sequence_number) (e.g., lib.binary_trace.BinaryTraceReader).
+    def add_input_stream(self, sc, trace):
+        # Reserve a sequence number for the stream, placing its events after all equally-timestamped events that are already in the queue, and before all future ones:
+        make_stream = getattr(trace, 'input_stream', None)
+        if make_stream is None:
+            stream = InputStream(self, sc, trace, self.next_sequence_number)
+        else:
+            stream = make_stream(self, sc, self.next_sequence_number)
+        self.next_sequence_number += 1
+        stream.pull()
+        return stream
+
+    def raise_table(self, sc):
+        try:
+            return self.raise_tables[sc]
+        except KeyError:
+            table = self.raise_tables[sc] = InputEventRegistry.of(sc).bind(sc)
+            return table
+
+    # Same as add_input, but with the event identified by its ID (see input_event_id)
+    def add_input_id(self, sc, event_id, timestamp, value=None):
+        raise_method, event_name = self.raise_table(sc)[event_id]
+        return self.add_input_lowlevel(timestamp, raise_method, value, event_name)
+
+    def add_input_id_relative(self, sc, event_id, time_offset=0, value=None):
+        return self.add_input_id(sc, event_id, self.simulated_time + time_offset, value)
+
     def add_input_lowlevel(self, timestamp, raise_method, value, event_name):
         e = QueueEntry(timestamp, raise_method, value, event_name)
-        self.event_queue.append(e)
-        # important to use a stable sorting algorithm here,
-        # so the order between equally-timestamped events is preserved:
-        self.event_queue.sort(key = lambda entry: entry.timestamp)
+        self.event_queue.push((timestamp, self.next_sequence_number, e))
+        self.next_sequence_number += 1
         return e
 
     # difference here is that the added event will occur BEFORE equally-timestamped events that were already in the queue
     def add_input_lowlevel_interrupt(self, timestamp, raise_method, value, event_name):
         e = QueueEntry(timestamp, raise_method, value, event_name)
-        self.event_queue.insert(0, e)
-        self.event_queue.sort(key = lambda entry: entry.timestamp)
+        self.event_queue.push((timestamp, self.next_interrupt_sequence_number, e))
+        self.next_interrupt_sequence_number -= 1
         return e
 
+    # Cancel an entry that was returned by one of the add_input_lowlevel* methods.
+    # The entry stays in the queue as a 'tombstone' until it is skipped or compacted away.
+    def cancel(self, e):
+        if e.canceled:
+            return
+        e.canceled = True
+        if e.queued:
+            e.tombstone = True
+            self.tombstones += 1
+            if self.tombstones >= self.compaction_threshold and self.tombstones * 2 >= len(self.event_queue):
+                self.compact()
+
+    # Removes all canceled entries from the queue - O(n)
+    def compact(self):
+        removed = self.event_queue.remove_canceled()
+        for e in removed:
+            e.queued = False
+        self.canceled_skipped += len(removed)
+        self.tombstones = 0
+        self.compactions += 1
+
     # Runs simulation as-fast-as-possible, until 'until'-timestamp (in simulated time)
     # blocking, synchronous function
     def run_until(self, until):
         # print('running until', pretty_time(until))
-        while self.have_event() and self.get_earliest() <= until:
-            e = self.event_queue[0]
-            for tracer in self.input_tracers:
-                tracer(e.timestamp, e.event_name, e.value)
-            # e = self.event_queue.pop();
-            self.event_queue = self.event_queue[1:]
-            if not e.canceled:
-                self.simulated_time = e.timestamp
-                if e.value == None:
-                    e.raise_method()
-                else:
-                    e.raise_method(e.value)
+        if self.stats is not None:
+            return run_until_instrumented(self, self.stats, until)
+        while True:
+            tup = self.peek_live()
+            if tup is None or tup[0] > until:
+                break
+            self.event_queue.pop()
+            e = tup[2]
+            e.queued = False
+            if self.input_tracers:
+                for tracer in self.input_tracers:
+                    tracer(e.timestamp, e.event_name, e.value)
+            self.simulated_time = e.timestamp
+            if e.value == None:
+                e.raise_method()
+            else:
+                e.raise_method(e.value)
+
+    # Returns the earliest (timestamp, sequence_number, QueueEntry)-tuple that is not canceled, or None if the queue has no live events.
+    # Canceled entries at the front of the queue are discarded along the way, so that real-time simulations never wake up for a canceled timer.
+    def peek_live(self):
+        event_queue = self.event_queue
+        while True:
+            try:
+                tup = event_queue.peek()
+            except IndexError:
+                return None
+            if not tup[2].canceled:
+                return tup
+            event_queue.pop()
+            e = tup[2]
+            e.queued = False
+            if e.tombstone:
+                self.tombstones -= 1
+            self.canceled_skipped += 1
 
     def have_event(self):
-        return len(self.event_queue) > 0
+        return self.peek_live() is not None
 
     def get_earliest(self):
-        # return self.event_queue[-1].timestamp
-        return self.event_queue[0].timestamp
+        return self.peek_live()[0]
+
+    # Start collecting statistics (dispatched events, time spent per event, ...) in run_until.
+    # Returns the ControllerStats object, which can be queried at any time, and dumped as JSON.
+    def enable_stats(self):
+        if self.stats is None:
+            self.stats = ControllerStats(self)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    # Queue health counters, e.g., for monitoring long-running simulations
+    # Entries canceled by setting their 'canceled' attribute directly (instead of with cancel) are not counted as tombstones, but as live entries, until they are skipped or compacted away.
+    def queue_stats(self):
+        return {
+            "live": len(self.event_queue) - self.tombstones,
+            "tombstones": self.tombstones,
+            "compactions": self.compactions,
+        }
 
 
 def pretty_time(time_ns):
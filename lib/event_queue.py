@@ -0,0 +1,189 @@
+# Event queue implementations ("backends") for the Controller.
+#
+# All backends store (timestamp, sequence_number, QueueEntry)-tuples, and order them by (timestamp, sequence_number).
+# The sequence number is unique, so QueueEntry objects themselves are never compared.
+#
+# A backend must implement:
+#   push(tup)          insert a tuple
+#   push_many(tuples)  insert a list of tuples
+#   peek()             return the smallest tuple, without removing it (raises IndexError if empty)
+#   pop()              remove and return the smallest tuple (raises IndexError if empty)
+#   remove_canceled()  remove all tuples whose QueueEntry is canceled, returns the removed entries
+#   __len__()          number of tuples in the queue (canceled or not)
+#   __iter__()         iterate over all tuples, in no particular order
+
+import heapq
+from bisect import insort
+from functools import partial
+from operator import getitem
+
+# Binary heap. O(log n) insert and pop. The default.
+class HeapEventQueue:
+    __slots__ = ('heap', 'push', 'peek', 'pop')
+
+    def __init__(self):
+        self.heap = []
+        # Bind the C-implemented heap functions directly, avoiding the overhead of a Python method call per event (For MAXIMUM performance :)
+        self.push = partial(heapq.heappush, self.heap)
+        self.peek = partial(getitem, self.heap, 0)
+        self.pop = partial(heapq.heappop, self.heap)
+
+    # O(n + k) for k new tuples, instead of O(k log n)
+    def push_many(self, tuples):
+        if len(tuples) * 8 < len(self.heap):
+            # Only a few new tuples: cheaper to push them one by one
+            for tup in tuples:
+                self.push(tup)
+        else:
+            self.heap.extend(tuples)
+            heapq.heapify(self.heap)
+
+    def remove_canceled(self):
+        removed = [tup[2] for tup in self.heap if tup[2].canceled]
+        # Filter in-place, because the bound functions refer to this list:
+        self.heap[:] = [tup for tup in self.heap if not tup[2].canceled]
+        heapq.heapify(self.heap)
+        return removed
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return iter(self.heap)
+
+
+# Calendar queue (R. Brown, "Calendar Queues: A Fast O(1) Priority Queue Implementation for the Simulation Event Set Problem", 1988).
+#
+# Time is divided in 'days' of 'width' nanoseconds. A 'year' consists of len(buckets) days, and every bucket holds the (sorted) events of the same day of every year.
+# Dequeueing walks through the days of the current year, like flipping through the pages of a calendar.
+# The number of buckets and their width are adjusted as the queue grows and shrinks, such that every bucket only holds a few events.
+# This gives amortized O(1) insert and pop, as long as timestamps are spread more or less uniformly, which is the case for large numbers of timers and plant responses.
+# The smallest tuple is kept apart ('front'), so that peek (called several times per dispatched event by the Controller) is a C-implemented function, like for the heap.
+#
+# Measured with benchmarks/bench_event_queue.py, this is NOT faster than HeapEventQueue: the heap's operations are implemented in C, while the calendar's bucket bookkeeping is Python code.
+# The calendar queue is clearly slower for up to about 10^4 pending events, and roughly on par (within measurement noise) at 10^5 to 10^6 pending events.
+class CalendarEventQueue:
+    __slots__ = ('buckets', 'width', 'size', 'current_day', 'front', 'peek', 'min_buckets')
+
+    # width: initial day width in nanoseconds (adapted automatically on resize)
+    def __init__(self, width=1000000, min_buckets=16):
+        self.min_buckets = min_buckets
+        self.width = width
+        self.buckets = [[] for _ in range(min_buckets)]
+        self.size = 0 # number of tuples in the buckets, i.e., not counting the front
+        # Absolute day number (timestamp // width) where the search for the smallest tuple in the buckets starts:
+        self.current_day = 0
+        # The smallest tuple, or empty if the queue is empty:
+        self.front = []
+        self.peek = partial(getitem, self.front, 0)
+
+    def push(self, tup):
+        front = self.front
+        if not front:
+            front.append(tup)
+            return
+        if tup < front[0]:
+            # New smallest tuple: the old one goes in the buckets
+            tup, front[0] = front[0], tup
+        day = int(tup[0] // self.width)
+        buckets = self.buckets
+        insort(buckets[day % len(buckets)], tup)
+        self.size += 1
+        if day < self.current_day:
+            # Earlier than where we are looking: go back in time
+            self.current_day = day
+        if self.size > 2 * len(buckets):
+            self.resize(2 * len(buckets))
+
+    def push_many(self, tuples):
+        if len(tuples) * 8 < len(self):
+            for tup in tuples:
+                self.push(tup)
+        else:
+            self.reset(list(self) + tuples)
+
+    def pop(self):
+        front = self.front
+        tup = front[0] # raises IndexError if empty
+        if self.size:
+            front[0] = self.take()
+        else:
+            front.pop()
+        return tup
+
+    # Remove and return the smallest tuple in the buckets (which must not be empty), moving current_day to its day
+    def take(self):
+        buckets = self.buckets
+        num_buckets = len(buckets)
+        width = self.width
+        day = self.current_day
+        for _ in range(num_buckets):
+            bucket = buckets[day % num_buckets]
+            # The bucket also contains tuples of later years, only take its first tuple if it belongs to the current year:
+            if bucket and bucket[0][0] < (day + 1) * width:
+                break
+            day += 1
+        else:
+            # Went through an entire year without finding a tuple: days are too short for how sparse the tuples are. Re-estimate the width, which also moves current_day to the smallest tuple:
+            self.resize(num_buckets)
+            return self.take()
+        self.current_day = day
+        self.size -= 1
+        tup = bucket.pop(0)
+        if self.size < num_buckets // 2 and num_buckets > self.min_buckets:
+            self.resize(num_buckets // 2)
+        return tup
+
+    def resize(self, num_buckets):
+        tuples = [tup for bucket in self.buckets for tup in bucket]
+        self.width = self.estimate_width(tuples)
+        self.rebuild(tuples, num_buckets)
+
+    # Replace the contents of the queue by the given tuples
+    def reset(self, tuples):
+        num_buckets = self.min_buckets
+        while 2 * num_buckets < len(tuples):
+            num_buckets *= 2
+        self.front.clear()
+        if tuples:
+            earliest = min(tuples)
+            self.front.append(earliest)
+            tuples = [tup for tup in tuples if tup is not earliest]
+        self.width = self.estimate_width(tuples)
+        self.rebuild(tuples, num_buckets)
+
+    # Brown's heuristic: the day width should be about 3 times the average time separation between the first events in the queue (ignoring outliers).
+    def estimate_width(self, tuples, sample_size=25):
+        sample = heapq.nsmallest(sample_size, tuples)
+        separations = [b[0] - a[0] for a, b in zip(sample, sample[1:])]
+        if not separations:
+            return self.width
+        average = sum(separations) / len(separations)
+        separations = [sep for sep in separations if sep <= 2 * average]
+        average = sum(separations) / len(separations) if separations else average
+        return max(1, int(3 * average)) if average > 0 else self.width
+
+    # Distribute the tuples (not including the front) over num_buckets buckets
+    def rebuild(self, tuples, num_buckets):
+        buckets = [[] for _ in range(num_buckets)]
+        width = self.width
+        for tup in tuples:
+            buckets[int(tup[0] // width) % num_buckets].append(tup)
+        for bucket in buckets:
+            bucket.sort()
+        self.buckets = buckets
+        self.size = len(tuples)
+        self.current_day = int(min(tuples)[0] // width) if tuples else 0
+
+    def remove_canceled(self):
+        removed = [tup[2] for tup in self if tup[2].canceled]
+        self.reset([tup for tup in self if not tup[2].canceled])
+        return removed
+
+    def __len__(self):
+        return len(self.front) + self.size
+
+    def __iter__(self):
+        yield from self.front
+        for bucket in self.buckets:
+            yield from bucket
@@ -0,0 +1,78 @@
+# Simulation of many statechart instances (e.g., all the cranes in a yard) on a single Controller.
+#
+# All instances share one event queue, one timer service, and (optionally) one tracer.
+# Instances are identified by their index in the fleet.
+
+from lib.controller import Controller, InputEventRegistry
+from lib.tracer import FleetTracer
+from lib.yakindu_helpers import FleetTimerService, OutputEventRegistry, OutputEventMultiplexer, enable_fast_path
+
+class Fleet:
+    # statechart_class: e.g., srcgen.statechart.Statechart
+    # tracer: FleetTracer, or None for no tracing at all (fastest)
+    # fast_path: use the (unlocked) fast-path runtime for the generated code, see lib/yakindu_helpers.py
+    def __init__(self, controller: Controller, statechart_class, size, tracer: FleetTracer = None, fast_path=True):
+        self.controller = controller
+        self.tracer = tracer
+        self.fast_path = fast_path
+        self.timer_service = FleetTimerService(controller)
+        self.instances = []
+        for _ in range(size):
+            self.add_instance(statechart_class())
+
+    # Returns the index of the new instance
+    def add_instance(self, sc):
+        instance = len(self.instances)
+        if self.fast_path:
+            enable_fast_path(sc)
+        sc.timer_service = self.timer_service
+        self.instances.append(sc)
+        if self.tracer is not None:
+            # Input events are recorded by the raise methods themselves, because the Controller's input tracers do not know which instance an event is for:
+            self.controller.raise_tables[sc] = [
+                (self.traced_raise_method(instance, raise_method, event_name), event_name)
+                    for (raise_method, event_name) in InputEventRegistry.of(sc).bind(sc)
+            ]
+            OutputEventMultiplexer.of(sc).subscribe(
+                self.tracer.output_event_sink(self.controller, OutputEventRegistry.of(sc).names, instance))
+        return instance
+
+    def traced_raise_method(self, instance, raise_method, event_name):
+        return TracedRaiseMethod(self.controller, self.tracer, instance, raise_method, event_name)
+
+    def __len__(self):
+        return len(self.instances)
+
+    def __getitem__(self, instance):
+        return self.instances[instance]
+
+    # Enter the default state(s) of all instances
+    def enter(self):
+        for sc in self.instances:
+            sc.enter()
+
+    # Same as Controller.add_input, but for the instance with the given index
+    def add_input(self, instance, event_name, timestamp, value=None):
+        return self.controller.add_input(self.instances[instance], event_name, timestamp, value)
+
+    def add_input_relative(self, instance, event_name, time_offset=0, value=None):
+        return self.controller.add_input_relative(self.instances[instance], event_name, time_offset, value)
+
+# Raise method of an instance in a traced fleet, that also records the input event
+# A class rather than a closure, so that it can be pickled (see lib/snapshot.py)
+class TracedRaiseMethod:
+    __slots__ = ('controller', 'tracer', 'instance', 'raise_method', 'event_name')
+
+    def __init__(self, controller, tracer, instance, raise_method, event_name):
+        self.controller = controller
+        self.tracer = tracer
+        self.instance = instance
+        self.raise_method = raise_method
+        self.event_name = event_name
+
+    def __call__(self, value=None):
+        self.tracer.record_input_event(self.instance, self.controller.simulated_time, self.event_name, value)
+        if value is None:
+            self.raise_method()
+        else:
+            self.raise_method(value)
@@ -0,0 +1,1033 @@
+# Table-driven interpreter for YAKINDU / itemis CREATE statechart models (.ysc files).
+#
+# Instead of generating srcgen/statechart.py with the itemis tool, a model can be loaded directly:
+#
+#   Statechart = load_statechart("Statechart.ysc")
+#   sc = Statechart()
+#
+# The resulting class has the same public API and the same observable behavior as the generated code: interfaces with raise_* methods and *_observable output events, timer_service, enter(), exit(), run_cycle(), is_state_active(), State enum, ...
+#
+# Loading happens in two phases:
+#   analyse_model: parses the XMI and the textual specification, and produces the 'analysed model': plain data (dicts, lists, strings), including the transition tables, and the Python source code of all actions and guards
+#   compile_model: compiles the analysed model into a Python class
+# The analysed model and its compiled code are cached on disk (see load_model), so that parsing and analysis only happen when the model has changed.
+#
+# Supported:
+#   @EventDriven, @SuperSteps(no) (the only supported execution semantics, same as the generated code)
+#   interfaces (named and unnamed) and internal scope, with in/out events (with or without value), variables and constants
+#   composite states, orthogonal regions, entry nodes, final states
+#   entry/exit actions, local reactions, transitions with triggers, guards and actions
+#   triggers: events, 'after <expr> s|ms|us|ns', 'always', 'oncycle'
+# Not supported (NotImplementedError when loading): choices, history, exit nodes, synchronizations, 'every', operations.
+
+import hashlib
+import marshal
+import os
+import pickle
+import re
+import sys
+import xml.etree.ElementTree as ET
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../lib')))
+# Must be imported exactly like the generated code does, see lib/yakindu_helpers.py:
+from yakindu.rx import Observable
+
+XMI_ID = '{http://www.omg.org/XMI}id'
+XSI_TYPE = '{http://www.w3.org/2001/XMLSchema-instance}type'
+
+# In milliseconds, the unit of the timer service
+TIME_UNITS = {'s': ' * 1000', 'ms': '', 'us': ' / 1000', 'ns': ' / 1000000'}
+
+
+def snake(name):
+    return re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name).lower()
+
+def camel(name):
+    return snake(name).replace('_', ' ').title().replace(' ', '')
+
+
+# ---------------------------------------------------------------------------
+# Textual specification language: tokenizer and expression / statement parser
+# ---------------------------------------------------------------------------
+
+TOKEN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<number>0[xX][0-9a-fA-F]+|\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>==|!=|<=|>=|&&|\|\||\+\+|--|\+=|-=|\*=|/=|%=|<<|>>|[-+*/%<>=!?:;,.()\[\]@&|^~])
+''', re.VERBOSE)
+
+def strip_comments(text):
+    return re.sub(r'//[^\n]*|/\*.*?\*/', '', text, flags=re.DOTALL)
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if m is None:
+            raise SyntaxError(f"Unexpected character {text[pos]!r} in {text!r}")
+        if m.lastgroup != 'ws':
+            tokens.append((m.lastgroup, m.group()))
+        pos = m.end()
+    return tokens
+
+BINARY_OPERATORS = {
+    # operator: (precedence, python operator)
+    '||': (1, 'or'),
+    '&&': (2, 'and'),
+    '|': (3, '|'), '^': (4, '^'), '&': (5, '&'),
+    '==': (6, '=='), '!=': (6, '!='),
+    '<': (7, '<'), '<=': (7, '<='), '>': (7, '>'), '>=': (7, '>='),
+    '<<': (8, '<<'), '>>': (8, '>>'),
+    '+': (9, '+'), '-': (9, '-'),
+    '*': (10, '*'), '/': (10, '/'), '%': (10, '%'),
+}
+ASSIGNMENT_OPERATORS = ['=', '+=', '-=', '*=', '/=', '%=']
+
+# Translates expressions and statements of the specification language to Python source code.
+# All references are resolved through 'scope' (see Scope class).
+class Parser:
+    def __init__(self, tokens, scope):
+        self.tokens = tokens
+        self.pos = 0
+        self.scope = scope
+
+    def peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset][1]
+        return None
+
+    def next(self):
+        if self.at_end():
+            raise SyntaxError(f"Unexpected end of: {self.text()}")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        if self.peek() != value:
+            raise SyntaxError(f"Expected {value!r}, got {self.peek()!r} in: {self.text()}")
+        self.pos += 1
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    def text(self):
+        return ' '.join(value for _, value in self.tokens)
+
+    def expression(self, min_precedence=0):
+        if min_precedence == 0:
+            condition = self.expression(1)
+            if self.peek() == '?':
+                self.next()
+                then = self.expression()
+                self.expect(':')
+                otherwise = self.expression()
+                return f"({then} if {condition} else {otherwise})"
+            return condition
+        left = self.unary()
+        while self.peek() in BINARY_OPERATORS and self.tokens[self.pos][0] == 'op':
+            precedence, python_operator = BINARY_OPERATORS[self.peek()]
+            if precedence < min_precedence:
+                break
+            self.next()
+            right = self.expression(precedence + 1)
+            left = f"({left} {python_operator} {right})"
+        return left
+
+    def unary(self):
+        token = self.peek()
+        if token == '!':
+            self.next()
+            return f"(not {self.unary()})"
+        if token in ('-', '+', '~'):
+            self.next()
+            return f"({token}{self.unary()})"
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.next()
+        if value == '(':
+            inner = self.expression()
+            self.expect(')')
+            return f"({inner})"
+        if kind in ('number', 'string'):
+            return value
+        if kind == 'name':
+            if value == 'true':
+                return 'True'
+            if value == 'false':
+                return 'False'
+            if value == 'null':
+                return 'None'
+            if value == 'valueof':
+                self.expect('(')
+                reference = self.reference_path()
+                self.expect(')')
+                return self.scope.event_value(reference)
+            self.pos -= 1
+            return self.scope.read(self.reference_path())
+        raise SyntaxError(f"Unexpected {value!r} in: {self.text()}")
+
+    # e.g., 'craneControl.move' -> ['craneControl', 'move']
+    def reference_path(self):
+        kind, value = self.next()
+        if kind != 'name':
+            raise SyntaxError(f"Expected a name, got {value!r} in: {self.text()}")
+        path = [value]
+        while self.peek() == '.':
+            self.next()
+            path.append(self.next()[1])
+        return path
+
+    # Returns a list of Python statements
+    def statements(self):
+        result = []
+        while not self.at_end():
+            if self.peek() == ';':
+                self.next()
+                continue
+            result.append(self.statement())
+        return result
+
+    def statement(self):
+        if self.peek() == 'raise':
+            self.next()
+            reference = self.reference_path()
+            value = None
+            if self.peek() == ':':
+                self.next()
+                value = self.expression()
+            return self.scope.raise_event(reference, value)
+        reference = self.reference_path()
+        operator = self.peek()
+        if operator in ASSIGNMENT_OPERATORS:
+            self.next()
+            return f"{self.scope.write(reference)} {operator} {self.expression()}"
+        if operator in ('++', '--'):
+            self.next()
+            return f"{self.scope.write(reference)} {operator[0]}= 1"
+        raise SyntaxError(f"Not a statement: {self.text()}")
+
+
+# ---------------------------------------------------------------------------
+# Declarations (definition section of the statechart)
+# ---------------------------------------------------------------------------
+
+# Everything declared in the definition section, and resolution of references to it
+class Scope:
+    def __init__(self):
+        # interface name as in model (None for unnamed interface / internal scope) -> dict
+        self.interfaces = {}
+        # event key (int) -> (interface, event name as in model, direction, has_value)
+        self.events = []
+        self.variables = [] # (python target, initial value source)
+
+    def interface(self, name):
+        if name not in self.interfaces:
+            self.interfaces[name] = {'events': {}, 'variables': {}, 'constants': {}}
+        return self.interfaces[name]
+
+    # Python expression for the object holding members of interface 'name', from within a function with parameter 'sc'
+    def owner(self, name):
+        return 'sc' if name in (None, '__internal__') else 'sc.' + snake(name)
+
+    def declare_event(self, interface, direction, name, has_value):
+        key = len(self.events)
+        self.interface(interface)['events'][name] = key
+        self.events.append((interface, name, direction, has_value))
+        return key
+
+    def lookup(self, path):
+        if len(path) == 2 and path[0] in self.interfaces:
+            return path[0], path[1]
+        if len(path) == 1:
+            # unqualified: internal scope first, then unnamed interface
+            for interface in ('__internal__', None):
+                members = self.interfaces.get(interface)
+                if members and any(path[0] in members[kind] for kind in members):
+                    return interface, path[0]
+        raise NameError(f"Unknown reference '{'.'.join(path)}'")
+
+    def is_event(self, path):
+        try:
+            interface, name = self.lookup(path)
+        except NameError:
+            return False
+        return name in self.interfaces[interface]['events']
+
+    def event_key(self, path):
+        interface, name = self.lookup(path)
+        try:
+            return self.interfaces[interface]['events'][name]
+        except KeyError:
+            raise NameError(f"'{'.'.join(path)}' is not an event") from None
+
+    def read(self, path):
+        # 'event.value' is an alternative syntax for 'valueof(event)'
+        if path[-1] == 'value' and len(path) > 1 and self.is_event(path[:-1]):
+            return self.event_value(path[:-1])
+        interface, name = self.lookup(path)
+        members = self.interfaces[interface]
+        if name in members['events']:
+            # event used as a boolean (e.g., in a guard): is it the event currently being processed?
+            return f"(sc.current_event == {members['events'][name]})"
+        if name in members['constants']:
+            return f"{self.owner(interface)}.{name}"
+        return f"{self.owner(interface)}.{snake(name)}"
+
+    def write(self, path):
+        interface, name = self.lookup(path)
+        if name not in self.interfaces[interface]['variables']:
+            raise NameError(f"Cannot assign to '{'.'.join(path)}'")
+        return f"{self.owner(interface)}.{snake(name)}"
+
+    def event_value(self, path):
+        interface, name = self.lookup(path)
+        return f"{self.owner(interface)}.{snake(name)}_value"
+
+    def raise_event(self, path, value):
+        key = self.event_key(path)
+        interface, name, direction, has_value = self.events[key]
+        if direction == 'out':
+            return f"{self.owner(interface)}.{snake(name)}_observable.next({'' if value is None else value})"
+        # internal (or local) events are queued, and processed in the same run-to-completion step
+        return f"sc.internal_event_queue.append(({key}, {'None' if value is None else value}))"
+
+def parse_definition(specification, scope):
+    annotations = []
+    interface = None
+    for line in strip_comments(specification).split('\n'):
+        tokens = tokenize(line)
+        if not tokens:
+            continue
+        words = [value for _, value in tokens]
+        if words[0] == '@':
+            annotations.append(''.join(words[1:]))
+        elif words[0] == 'interface':
+            interface = words[1] if len(words) > 2 else None
+            scope.interface(interface)
+        elif words[0] == 'internal':
+            interface = '__internal__'
+            scope.interface(interface)
+        elif words[0] in ('in', 'out', 'event'):
+            direction = words[0] if words[0] != 'event' else 'internal'
+            i = words.index('event') + 1
+            scope.declare_event(interface, direction, words[i], ':' in words[i:])
+        elif words[0] in ('var', 'const'):
+            i = 1
+            if words[i] == 'readonly':
+                i += 1
+            name = words[i]
+            initial = 'None'
+            if '=' in words:
+                initial = Parser(tokens[words.index('=') + 1:], scope).expression()
+            members = scope.interface(interface)
+            if words[0] == 'const':
+                members['constants'][name] = True
+                scope.variables.append((f"{scope.owner(interface)}.{name}", initial))
+            else:
+                members['variables'][name] = True
+                scope.variables.append((f"{scope.owner(interface)}.{snake(name)}", initial))
+        elif words[0] in ('operation', 'import', 'namespace'):
+            raise NotImplementedError(f"Not supported: {line.strip()}")
+        else:
+            raise SyntaxError(f"Cannot parse declaration: {line.strip()}")
+    for annotation in annotations:
+        if annotation not in ('EventDriven', 'SuperSteps(no)', 'ChildFirstExecution'):
+            raise NotImplementedError(f"Not supported: @{annotation}. Only @EventDriven and @SuperSteps(no) are supported.")
+    if 'EventDriven' not in annotations:
+        raise NotImplementedError("Only @EventDriven statecharts are supported.")
+
+
+# ---------------------------------------------------------------------------
+# Reactions (transitions and local reactions)
+# ---------------------------------------------------------------------------
+
+class Reaction:
+    def __init__(self):
+        self.triggers = [] # event keys
+        self.always = False # no trigger, 'always' or 'oncycle'
+        self.after = None # duration in ms (Python source), for 'after' triggers
+        self.guard = None # Python source
+        self.actions = [] # Python statements
+
+def parse_reaction(text, scope, allow_entry_exit=False):
+    tokens = tokenize(text)
+    parser = Parser(tokens, scope)
+    reaction = Reaction()
+    kind = 'reaction'
+    while not parser.at_end() and parser.peek() not in ('[', '/'):
+        word = parser.peek()
+        if word == ',':
+            parser.next()
+        elif word == 'after':
+            parser.next()
+            duration = parser.expression()
+            unit = parser.next()[1]
+            if unit not in TIME_UNITS:
+                raise SyntaxError(f"Unknown time unit {unit!r} in: {text}")
+            reaction.after = f"({duration}{TIME_UNITS[unit]})"
+        elif word == 'every':
+            raise NotImplementedError(f"Not supported: 'every' in: {text}")
+        elif word in ('always', 'oncycle'):
+            parser.next()
+            reaction.always = True
+        elif word in ('entry', 'exit') and allow_entry_exit:
+            parser.next()
+            kind = word
+        elif word in ('else', 'default'):
+            raise NotImplementedError(f"Not supported: choices ('{word}' in: {text})")
+        else:
+            reaction.triggers.append(scope.event_key(parser.reference_path()))
+    if parser.peek() == '[':
+        parser.next()
+        reaction.guard = parser.expression()
+        parser.expect(']')
+    if parser.peek() == '/':
+        parser.next()
+        reaction.actions = parser.statements()
+    if not reaction.triggers and reaction.after is None and kind == 'reaction':
+        # no trigger at all: reacts in every run-to-completion step
+        reaction.always = True
+    return kind, reaction
+
+# Splits the specification of a state into reactions: every line that contains a '/' (or a '[') starts a new reaction, other lines continue the actions of the previous one
+def split_reactions(specification):
+    reactions = []
+    for line in strip_comments(specification).split('\n'):
+        if not line.strip():
+            continue
+        if reactions and '/' not in line:
+            reactions[-1] += '; ' + line
+        else:
+            reactions.append(line)
+    return reactions
+
+
+# ---------------------------------------------------------------------------
+# Structure (states and regions)
+# ---------------------------------------------------------------------------
+
+class Region:
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent # State or None
+        self.states = []
+        self.initial = None # Transition from the entry node
+        self.first_slot = 0
+        self.slots = 1
+
+class State:
+    def __init__(self, id, name, parent_region, final=False):
+        self.id = id
+        self.name = name
+        self.parent_region = parent_region
+        self.final = final
+        self.regions = []
+        self.entry_actions = []
+        self.exit_actions = []
+        self.local_reactions = []
+        self.transitions = []
+        self.enum_name = None
+        self.index = None
+        self.first_slot = 0
+        self.slots = 1
+
+    @property
+    def parent(self):
+        return self.parent_region.parent
+
+    def ancestors(self): # from parent to root
+        state = self.parent
+        while state is not None:
+            yield state
+            state = state.parent
+
+class Transition:
+    def __init__(self, source, target_id, reaction):
+        self.source = source
+        self.target_id = target_id
+        self.target = None
+        self.reaction = reaction
+        self.index = None
+
+def parse_region(element, parent, scope, states_by_id, pending_transitions):
+    region = Region(element.get('name'), parent)
+    for vertex in element.findall('vertices'):
+        kind = vertex.get(XSI_TYPE)
+        if kind == 'sgraph:State':
+            state = State(vertex.get(XMI_ID), vertex.get('name'), region)
+            region.states.append(state)
+            states_by_id[state.id] = state
+            for text in split_reactions(vertex.get('specification', '')):
+                kind, reaction = parse_reaction(text, scope, allow_entry_exit=True)
+                if kind == 'entry':
+                    state.entry_actions += reaction.actions
+                elif kind == 'exit':
+                    state.exit_actions += reaction.actions
+                else:
+                    state.local_reactions.append(reaction)
+            for sub_region in vertex.findall('regions'):
+                state.regions.append(parse_region(sub_region, state, scope, states_by_id, pending_transitions))
+            for t in vertex.findall('outgoingTransitions'):
+                _, reaction = parse_reaction(t.get('specification', ''), scope)
+                transition = Transition(state, t.get('target'), reaction)
+                state.transitions.append(transition)
+                pending_transitions.append(transition)
+        elif kind == 'sgraph:FinalState':
+            state = State(vertex.get(XMI_ID), '_final_', region, final=True)
+            region.states.append(state)
+            states_by_id[state.id] = state
+        elif kind == 'sgraph:Entry':
+            if vertex.get('kind') not in (None, 'INITIAL'):
+                raise NotImplementedError(f"Not supported: history entry in region '{region.name}'")
+            outgoing = vertex.findall('outgoingTransitions')
+            if outgoing:
+                _, reaction = parse_reaction(outgoing[0].get('specification', ''), scope)
+                region.initial = Transition(None, outgoing[0].get('target'), reaction)
+                pending_transitions.append(region.initial)
+        else:
+            raise NotImplementedError(f"Not supported: {kind} in region '{region.name}'")
+    return region
+
+# Number the states (same order and naming as the generated State enum) and assign state vector slots
+def number_states(regions, prefix, first_slot, states):
+    slot = first_slot
+    for region in regions:
+        region.first_slot = slot
+        region.slots = 1
+        for state in region.states:
+            if prefix is None:
+                state.enum_name = f"{snake(region.name)}_{snake(state.name)}"
+            else:
+                state.enum_name = f"{prefix}_{snake(region.name)}{snake(state.name)}"
+            state.index = len(states)
+            states.append(state)
+            state.first_slot = slot
+            state.slots = number_states(state.regions, state.enum_name, slot, states) if state.regions else 1
+            region.slots = max(region.slots, state.slots)
+        slot += region.slots
+    return slot - first_slot
+
+def leaves(state):
+    if not state.regions:
+        return [state]
+    return [leaf for region in state.regions for s in region.states for leaf in leaves(s)]
+
+# Is 'leaf' in the last region of 'ancestor' at every level? Then the reactions of 'ancestor' are processed when processing 'leaf' (once per run-to-completion step, even with orthogonal regions)
+def is_last_leaf(leaf, ancestor):
+    state = leaf
+    while state is not ancestor:
+        region = state.parent_region
+        if region is not region.parent.regions[-1]:
+            return False
+        state = region.parent
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Code generation for entering and exiting states
+# ---------------------------------------------------------------------------
+
+class CodeGenerator:
+    def __init__(self, states, num_slots, time_events):
+        self.states = states
+        self.num_slots = num_slots
+        self.time_events = time_events # transition -> time event id
+
+    def timers_entry(self, state):
+        return [f"sc.timer_service.set_timer(sc, {self.time_events[t]}, {t.reaction.after}, False)"
+            for t in state.transitions if t.reaction.after is not None]
+
+    def timers_exit(self, state):
+        return [f"sc.timer_service.unset_timer(sc, {self.time_events[t]})"
+            for t in state.transitions if t.reaction.after is not None]
+
+    # Enter 'state', and then (for composite states) all of its regions. If 'path' is given (list of descendants, outermost first), enter those instead of the default states of the regions containing them.
+    def enter_state(self, state, path=()):
+        code = self.timers_entry(state) + state.entry_actions
+        for region in state.regions:
+            if path and path[0].parent_region is region:
+                code += self.enter_state(path[0], path[1:])
+            else:
+                code += self.enter_region_default(region)
+        if not state.regions:
+            code.append(f"sc.state_vector[{state.first_slot}] = {state.index}")
+        return code
+
+    def enter_region_default(self, region):
+        if region.initial is None:
+            raise ValueError(f"Region '{region.name}' has no entry node")
+        return region.initial.reaction.actions + self.enter_state(region.initial.target)
+
+    # Exit 'state' and all of its active descendants. The active descendants are only known at run-time, hence the dispatch on the state vector.
+    def exit_state(self, state):
+        code = []
+        for region in state.regions:
+            code.append(f"{exit_region_name(region)}(sc)")
+        parent_value = state.parent.index if state.parent is not None else len(self.states)
+        for slot in range(state.first_slot, state.first_slot + state.slots):
+            code.append(f"sc.state_vector[{slot}] = {parent_value}")
+        return code + self.timers_exit(state) + state.exit_actions
+
+    def exit_region_function(self, region):
+        # active leaf state -> function exiting the direct substate of the region that contains it
+        cases = {}
+        for state in region.states:
+            for leaf in leaves(state):
+                cases[leaf.index] = state
+        lines = [f"def {exit_region_name(region)}(sc):", f"    s = sc.state_vector[{region.first_slot}]"]
+        for i, state in enumerate(region.states):
+            keyword = 'if' if i == 0 else 'elif'
+            indices = sorted(leaf.index for leaf in leaves(state))
+            lines.append(f"    {keyword} s in {tuple(indices)!r}:")
+            lines += ["        " + line for line in self.exit_state(state)]
+        return '\n'.join(lines)
+
+    def fire_transition(self, transition):
+        # The least common ancestor region contains both the exited and the entered state
+        target_chain = [transition.target] + list(transition.target.ancestors())
+        target_regions = [s.parent_region for s in target_chain]
+        for exited in [transition.source] + list(transition.source.ancestors()):
+            if exited.parent_region in target_regions:
+                break
+        else:
+            raise ValueError(f"Transition from '{transition.source.name}' to '{transition.target.name}' crosses orthogonal regions")
+        entered_path = target_chain[:target_regions.index(exited.parent_region) + 1][::-1]
+        entered = entered_path[0]
+        code = self.exit_state(exited) + transition.reaction.actions + self.enter_state(entered, entered_path[1:])
+        last_slot = max(exited.first_slot + exited.slots, entered.first_slot + entered.slots) - 1
+        return code, last_slot
+
+
+def exit_region_name(region):
+    prefix = 'exit' if region.parent is None else 'exit_' + region.parent.enum_name
+    return f"{prefix}_{snake(region.name)}"
+
+def function_source(name, body, params='sc'):
+    if not body:
+        body = ['pass']
+    return f"def {name}({params}):\n" + '\n'.join('    ' + line for line in body)
+
+
+# ---------------------------------------------------------------------------
+# Analysis: .ysc file -> analysed model (plain data)
+# ---------------------------------------------------------------------------
+
+def analyse_model(path):
+    root = ET.parse(path).getroot()
+    element = root.find('{http://www.yakindu.org/sct/sgraph/2.0.0}Statechart')
+    scope = Scope()
+    parse_definition(element.get('specification', ''), scope)
+
+    states_by_id = {}
+    pending_transitions = []
+    regions = [parse_region(r, None, scope, states_by_id, pending_transitions) for r in element.findall('regions')]
+    for transition in pending_transitions:
+        try:
+            transition.target = states_by_id[transition.target_id]
+        except KeyError:
+            raise NotImplementedError("Not supported: transition to a pseudostate other than a state or final state") from None
+
+    states = []
+    num_slots = number_states(regions, None, 0, states)
+
+    # Every 'after' trigger gets its own time event
+    time_events = {}
+    transitions = []
+    for state in states:
+        for transition in state.transitions:
+            transition.index = len(transitions)
+            transitions.append(transition)
+            if transition.reaction.after is not None:
+                time_events[transition] = len(time_events)
+    for state in states:
+        for reaction in state.local_reactions:
+            if reaction.after is not None:
+                raise NotImplementedError(f"Not supported: 'after' in local reaction of state '{state.name}'")
+    time_event_base = len(scope.events) # time events have keys after all other events
+
+    generator = CodeGenerator(states, num_slots, time_events)
+    functions = [] # Python source of all functions
+
+    fire = [] # transition index -> (name of guard function or None, name of fire function, last slot changed by the transition)
+    for transition in transitions:
+        code, last_slot = generator.fire_transition(transition)
+        functions.append(function_source(f"fire_{transition.index}", code))
+        guard = None
+        if transition.reaction.guard is not None:
+            guard = f"guard_{transition.index}"
+            functions.append(function_source(guard, [f"return {transition.reaction.guard}"]))
+        fire.append((guard, f"fire_{transition.index}", last_slot))
+
+    local = [] # local reaction index -> (name of guard function or None, name of action function)
+    local_reactions = {} # state -> [(local reaction index, reaction)]
+    for state in states:
+        for reaction in state.local_reactions:
+            index = len(local)
+            functions.append(function_source(f"local_{index}", reaction.actions))
+            guard = None
+            if reaction.guard is not None:
+                guard = f"local_guard_{index}"
+                functions.append(function_source(guard, [f"return {reaction.guard}"]))
+            local.append((guard, f"local_{index}"))
+            local_reactions.setdefault(state, []).append((index, reaction))
+
+    def triggered_by(reaction, transition, event_key):
+        if transition is not None and reaction.after is not None:
+            return event_key == time_event_base + time_events[transition]
+        return reaction.always or event_key in reaction.triggers
+
+    # The transition table: for every leaf state and event key (None = no event), the 'levels' (leaf, parent, ..., root) that have something to do.
+    # Every level is a tuple (threshold slot, [transition indices], [local reaction indices]), transitions of a level are only considered if no transition was taken yet in a slot >= threshold (see micro_step in compile_model)
+    event_keys = [None] + list(range(time_event_base + len(time_events)))
+    table = []
+    for state in states:
+        row = {}
+        if not state.regions:
+            levels_of_leaf = [state] + [a for a in state.ancestors() if is_last_leaf(state, a)]
+            for key in event_keys:
+                levels = []
+                for level_state in levels_of_leaf:
+                    ts = [t.index for t in level_state.transitions if triggered_by(t.reaction, t, key)]
+                    ls = [i for (i, r) in local_reactions.get(level_state, []) if triggered_by(r, None, key)]
+                    if ts or ls:
+                        threshold = state.first_slot if level_state is state else level_state.first_slot
+                        levels.append((threshold, ts, ls))
+                if levels:
+                    row[key] = levels
+        table.append(row)
+
+    initialization = [f"{target} = {initial}" for (target, initial) in scope.variables]
+    enter_code = [line for region in regions for line in generator.enter_region_default(region)]
+    exit_code = [f"{exit_region_name(region)}(sc)" for region in regions]
+    for state in states:
+        for region in state.regions:
+            functions.append(generator.exit_region_function(region))
+    for region in regions:
+        functions.append(generator.exit_region_function(region))
+    functions.append(function_source("initialize", initialization))
+    functions.append(function_source("enter_default", enter_code))
+    functions.append(function_source("exit_all", exit_code))
+
+    # is_state_active: state index -> all state indices for which it is active (itself and its descendants)
+    active_for = [sorted(s.index for s in states if s is state or state in s.ancestors()) for state in states]
+
+    interfaces = []
+    for name, members in scope.interfaces.items():
+        interfaces.append({
+            'name': name if name not in (None, '__internal__') else None,
+            'in_events': [(snake(e), key, scope.events[key][3]) for e, key in members['events'].items() if scope.events[key][2] == 'in'],
+            'out_events': [(snake(e), scope.events[key][3]) for e, key in members['events'].items() if scope.events[key][2] == 'out'],
+            'internal_events': [(snake(e), key, scope.events[key][3]) for e, key in members['events'].items() if scope.events[key][2] == 'internal'],
+        })
+
+    return {
+        'name': element.get('name'),
+        'interfaces': interfaces,
+        'states': [state.enum_name for state in states],
+        'final': [state.index for state in states if state.final],
+        'top_level_slots': [(region.first_slot, [s.index for s in region.states if s.final]) for region in regions],
+        'num_slots': num_slots,
+        'num_time_events': len(time_events),
+        'time_event_base': time_event_base,
+        'active_for': active_for,
+        'functions': '\n\n'.join(functions),
+        'fire': fire,
+        'local': local,
+        'table': table,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Compilation: analysed model -> Python class
+# ---------------------------------------------------------------------------
+
+def compile_functions(model):
+    return compile(model['functions'], f"<statechart {model['name']}>", 'exec')
+
+# code: result of compile_functions(model), if already available
+def compile_model(model, code=None):
+    namespace = {}
+    exec(code if code is not None else compile_functions(model), namespace)
+    fire = [(namespace[guard] if guard else None, namespace[function], last_slot) for (guard, function, last_slot) in model['fire']]
+    local = [(namespace[guard] if guard else None, namespace[function]) for (guard, function) in model['local']]
+    # Resolve the transition table: state index -> event key -> [(threshold slot, [(guard, fire, last exited slot)], [(guard, action)])]
+    table = [
+        {key: [(threshold, [fire[t] for t in ts], [local[l] for l in ls]) for (threshold, ts, ls) in levels] for key, levels in row.items()}
+            for row in model['table']
+    ] + [{}] # null_state
+    num_slots = model['num_slots']
+    null_state = len(model['states'])
+    active_for = [frozenset(indices) for indices in model['active_for']]
+    time_event_base = model['time_event_base']
+    num_time_events = model['num_time_events']
+    initialize = namespace['initialize']
+    enter_default = namespace['enter_default']
+    exit_all = namespace['exit_all']
+
+    State = type('State', (), {name: index for index, name in enumerate(model['states'] + ['null_state'])})
+
+    # Interface classes, with a raise method per input event.
+    # The input events of the unnamed interface are raised on the statechart itself.
+    interface_classes = []
+    for interface in model['interfaces']:
+        methods = {f"raise_{event}": make_raise_method(f"raise_{event}", key, has_value, interface['name'] is None)
+            for (event, key, has_value) in interface['in_events']}
+        if interface['name'] is not None:
+            methods['__reduce__'] = make_interface_reduce(camel(interface['name']))
+        interface_classes.append((interface, type(camel(interface['name'] or 'default'), (), methods)))
+
+    class Statechart:
+        """Interpreted statechart, see lib/interpreter.py"""
+        interpreted = True # see enable_fast_path in lib/yakindu_helpers.py
+        path = None # of the model, set by load_statechart (needed for pickling)
+
+        def __init__(self):
+            self.in_event_queue = deque() # (event key, value)
+            self.internal_event_queue = deque()
+            self.current_event = None
+            # event key -> (object, attribute) where the value of the event is stored, or None
+            self.event_values = [None] * (time_event_base + num_time_events)
+            for interface, cls in interface_classes:
+                if interface['name'] is None: # unnamed interface or internal scope
+                    obj = self
+                else:
+                    obj = cls()
+                    obj.statemachine = self
+                    setattr(self, snake(interface['name']), obj)
+                for (event, has_value) in interface['out_events']:
+                    setattr(obj, f"{event}_observable", Observable())
+                for (event, key, has_value) in interface['in_events'] + interface['internal_events']:
+                    if has_value:
+                        self.event_values[key] = (obj, f"{event}_value")
+                        setattr(obj, f"{event}_value", None)
+            self.State = State
+            self.state_vector = [null_state] * num_slots
+            self.timer_service = None
+            self.is_executing = False
+            initialize(self)
+
+        def is_active(self):
+            return any(s != null_state for s in self.state_vector)
+
+        def is_final(self):
+            return bool(model['final']) and all(self.state_vector[slot] in finals for (slot, finals) in model['top_level_slots'])
+
+        def is_state_active(self, state):
+            if state == null_state:
+                return False
+            active = active_for[state]
+            return any(s in active for s in self.state_vector)
+
+        def time_elapsed(self, event_id):
+            if 0 <= event_id < num_time_events:
+                self.raise_time_event(event_id)
+                self.run_cycle()
+
+        # Like the generated code, only raises the time event (i.e., queues it): it is handled by the next run-to-completion step
+        def raise_time_event(self, event_id):
+            self.in_event_queue.append((time_event_base + event_id, None))
+
+        # Same semantics as the generated code: the active leaf states react in state vector order, every leaf state before its ancestors ('child first').
+        # Ancestors only react if none of their descendants took a transition, and slots that were changed by a transition do not react anymore in the same step.
+        def micro_step(self, event):
+            state_vector = self.state_vector
+            transitioned = -1 # slot of the last transition taken
+            position = -1 # last slot changed by a transition
+            for slot in range(num_slots):
+                if slot <= position:
+                    continue
+                levels = table[state_vector[slot]].get(event)
+                if levels is None:
+                    continue
+                for (threshold, transitions, local_reactions) in levels:
+                    fired = False
+                    if transitioned < threshold:
+                        for (guard, fire, last_slot) in transitions:
+                            if guard is None or guard(self):
+                                fire(self)
+                                transitioned = slot
+                                position = last_slot
+                                fired = True
+                                break
+                    if not fired:
+                        for (guard, action) in local_reactions:
+                            if guard is None or guard(self):
+                                action(self)
+
+        # Processes all queued events (internal events first), one run-to-completion step per event.
+        # If no event is queued, a single step is made without event.
+        def run_cycle(self):
+            if self.timer_service is None:
+                raise ValueError('Timer service must be set.')
+            if self.is_executing:
+                return
+            self.is_executing = True
+            internal_event_queue = self.internal_event_queue
+            in_event_queue = self.in_event_queue
+            event_values = self.event_values
+            event = None
+            while True:
+                queue = internal_event_queue or in_event_queue
+                if queue:
+                    event, value = queue.popleft()
+                    target = event_values[event]
+                    if target is not None:
+                        setattr(target[0], target[1], value)
+                elif event is not None:
+                    break
+                self.current_event = event
+                self.micro_step(event)
+                self.current_event = None
+                if event is None:
+                    break
+            self.is_executing = False
+
+        def enter(self):
+            if self.timer_service is None:
+                raise ValueError('Timer service must be set.')
+            if self.is_executing:
+                return
+            self.is_executing = True
+            enter_default(self)
+            self.is_executing = False
+
+        def exit(self):
+            if self.is_executing:
+                return
+            self.is_executing = True
+            exit_all(self)
+            for slot in range(num_slots):
+                self.state_vector[slot] = null_state
+            self.is_executing = False
+
+        def trigger_without_event(self):
+            self.run_cycle()
+
+        # The class is created at runtime, so pickle cannot find it by name: instances are unpickled through the (re)loaded model instead (see restore_statechart).
+        # This makes Snapshot (lib/snapshot.py) work for interpreted statecharts.
+        def __reduce__(self):
+            path = type(self).path
+            if path is None:
+                raise pickle.PicklingError(f"Cannot pickle interpreted statechart {type(self).__name__}: its class was not created by load_statechart")
+            state = dict(vars(self))
+            del state['State'] # same as the class attribute
+            return (restore_statechart, (path,), state)
+
+    Statechart.__name__ = Statechart.__qualname__ = model['name']
+    Statechart.State = State
+    for interface, cls in interface_classes:
+        if interface['name'] is None:
+            for name, method in vars(cls).items():
+                if name.startswith('raise_'):
+                    setattr(Statechart, name, method)
+        else:
+            setattr(Statechart, camel(interface['name']), cls)
+    return Statechart
+
+def make_interface_reduce(class_name):
+    def __reduce__(self):
+        path = type(self.statemachine).path
+        if path is None:
+            raise pickle.PicklingError(f"Cannot pickle interface {class_name}: its statechart class was not created by load_statechart")
+        return (restore_interface, (path, class_name), vars(self))
+    return __reduce__
+
+# Statechart classes by (absolute) model path: the class most recently loaded by load_statechart, used for unpickling
+statechart_classes = {}
+
+def restored_statechart_class(path):
+    try:
+        return statechart_classes[path]
+    except KeyError:
+        return load_statechart(path)
+
+def restore_statechart(path):
+    cls = restored_statechart_class(path)
+    return cls.__new__(cls)
+
+def restore_interface(path, class_name):
+    cls = getattr(restored_statechart_class(path), class_name)
+    return cls.__new__(cls)
+
+def make_raise_method(name, key, has_value, on_statechart):
+    if on_statechart:
+        if has_value:
+            def raise_event(self, value):
+                self.in_event_queue.append((key, value))
+                self.run_cycle()
+        else:
+            def raise_event(self):
+                self.in_event_queue.append((key, None))
+                self.run_cycle()
+    elif has_value:
+        def raise_event(self, value):
+            self.statemachine.in_event_queue.append((key, value))
+            self.statemachine.run_cycle()
+    else:
+        def raise_event(self):
+            self.statemachine.in_event_queue.append((key, None))
+            self.statemachine.run_cycle()
+    # Bound methods are pickled by name (e.g., those in Controller.raise_tables):
+    raise_event.__name__ = raise_event.__qualname__ = name
+    return raise_event
+
+
+# ---------------------------------------------------------------------------
+# On-disk cache of analysed models
+# ---------------------------------------------------------------------------
+
+# The cache is stored next to the model, in __pycache__, like Python's own bytecode cache.
+# Cache files are keyed by a hash of everything that determines their contents: the model, its code generation options (.sgen file with the same name, if any), this file, and the Python version (the compiled code is version-specific).
+def cache_path(path):
+    h = hashlib.sha256()
+    sgen_path = os.path.splitext(path)[0] + '.sgen'
+    for p in (path, sgen_path, __file__):
+        if os.path.exists(p):
+            with open(p, 'rb') as f:
+                h.update(f.read())
+        h.update(b'\0')
+    h.update(sys.version.encode())
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, '__pycache__', f"{name}.{h.hexdigest()[:16]}.model")
+
+# Returns (analysed model, compiled code), from the cache if possible.
+# If the cache cannot be read or written (e.g., read-only file system), the model is simply analysed again.
+def load_model(path, cache=True):
+    if cache:
+        cached = cache_path(path)
+        try:
+            with open(cached, 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+    model = analyse_model(path)
+    code = compile_functions(model)
+    if cache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            # Write to a temporary file first, so that concurrent processes never see a partially written cache file:
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                marshal.dump((model, code), f)
+            os.replace(tmp, cached)
+            # Remove cache files of earlier versions of the model:
+            prefix = os.path.basename(cached).rsplit('.', 2)[0] + '.'
+            for name in os.listdir(os.path.dirname(cached)):
+                if name.startswith(prefix) and name.endswith('.model') and name != os.path.basename(cached):
+                    os.remove(os.path.join(os.path.dirname(cached), name))
+        except OSError:
+            pass
+    return model, code
+
+def load_statechart(path, cache=True):
+    model, code = load_model(path, cache)
+    cls = compile_model(model, code)
+    cls.path = os.path.abspath(path)
+    statechart_classes[cls.path] = cls
+    return cls
@@ -0,0 +1,79 @@
+import asyncio
+
+from lib.controller import Controller
+from lib.realtime.event_loop import AbstractEventLoop, EventLoopRealTimeSimulation
+from lib.realtime.realtime import WallClock
+from lib.yakindu_helpers import OutputEventRegistry
+from lib.yakindu.rx import Observer
+
+# schedules calls in an asyncio event loop
+class AsyncioEventLoopAdapter(AbstractEventLoop):
+    resolution = 1000000 # the selector (e.g., epoll) waits in whole milliseconds, rounding up
+
+    # loop: defaults to the running event loop
+    def __init__(self, loop=None):
+        self.loop = asyncio.get_running_loop() if loop is None else loop
+
+    def schedule(self, delay, callback):
+        # loop.time() is the loop's own monotonic clock
+        return self.loop.call_at(self.loop.time() + delay / 1000000000, # ns to s
+            callback)
+
+    def cancel(self, handle):
+        handle.cancel()
+
+
+# Real-time simulation in an asyncio event loop: coroutines (e.g., network bridges, sensor readers) can add inputs and wait for outputs without any extra threads or locks.
+# add_input_now has the same semantics as in EventLoopRealTimeSimulation (including coalesce_window and deadline_scheduler). Coroutines can call it directly, because they run in the event loop's thread.
+#
+# Typical usage (from a coroutine):
+#   sim = AsyncioRealTimeSimulation(controller, wall_clock, termination_condition=...)
+#   wall_clock.record_start_time()
+#   sc.enter()
+#   sim.poke()
+#   ...
+#   moved = sim.wait_for_output(sc, 'crane_control.move')
+#   sim.add_input_now(sc, 'scheduler.make_move')
+#   value = await moved
+#   ...
+#   await sim.terminated()
+class AsyncioRealTimeSimulation(EventLoopRealTimeSimulation):
+    def __init__(self, controller: Controller, wall_clock: WallClock, termination_condition=lambda: False, time_advance_callback=lambda:None, loop=None, coalesce_window=None, deadline_scheduler=None):
+        super().__init__(controller, AsyncioEventLoopAdapter(loop), wall_clock, termination_condition, time_advance_callback, coalesce_window, deadline_scheduler)
+        self.termination = self.event_loop.loop.create_future()
+
+    def poke(self):
+        super().poke()
+        if not self.termination.done() and self.termination_condition():
+            self.termination.set_result(None)
+
+    # Returns a future that is done when the termination condition is satisfied
+    def terminated(self):
+        return self.termination
+
+    # Returns a future that gets the value of the next occurrence of the given output event (e.g., 'crane_control.move'), or of the next occurrence for which predicate(value) holds.
+    # Subscribes immediately, so an occurrence caused by an input that is added right after calling this method is not missed.
+    # Can be combined with asyncio.wait_for for a timeout.
+    def wait_for_output(self, sc, event_name, predicate=None):
+        registry = OutputEventRegistry.of(sc)
+        try:
+            event_id = registry.ids[event_name]
+        except KeyError:
+            raise ValueError(f"Unknown output event '{event_name}' for {type(sc).__name__}") from None
+        interface, attr = registry.paths[event_id]
+        observable = getattr(sc if interface is None else getattr(sc, interface), attr)
+        future = self.event_loop.loop.create_future()
+        observer = FutureObserver(future, predicate)
+        observable.subscribe(observer)
+        # Done callbacks run later in the event loop, so we never unsubscribe while the observable is iterating over its observers:
+        future.add_done_callback(lambda _: observable.unsubscribe(observer))
+        return future
+
+class FutureObserver(Observer):
+    def __init__(self, future, predicate):
+        self.future = future
+        self.predicate = predicate
+
+    def next(self, value=None):
+        if not self.future.done() and (self.predicate is None or self.predicate(value)):
+            self.future.set_result(value)
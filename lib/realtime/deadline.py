@@ -0,0 +1,49 @@
+# Hybrid deadline scheduling for the real-time simulation drivers (ThreadedRealTimeSimulation and EventLoopRealTimeSimulation): precise wakeups, at the cost of some CPU time.
+#
+# Timers of the OS (and of event loops, e.g., Tk only knows whole milliseconds) wake us up too late, by an amount that depends on the OS and on the load.
+# At high time scales, being late by a fraction of a millisecond is a visible error in simulated time.
+# A DeadlineScheduler therefore sleeps (coarsely) until a bit before the deadline, and then busy-waits (spins) until the deadline.
+# The spin duration trades precision for CPU time: every wakeup burns up to 'spin' nanoseconds of CPU time (and, for an event loop, blocks it for that long).
+# By default, the spin duration is calibrated: we measure how late the OS wakes us up, and spin that long, but never longer than max_spin.
+
+import time
+
+CALIBRATION_SAMPLES = 20
+CALIBRATION_SLEEP = 1000000 # ns
+
+class DeadlineScheduler:
+    # spin: nanoseconds of busy-waiting before every deadline, or None to calibrate
+    # max_spin: upper bound for the calibrated spin duration, i.e., the CPU time (ns) we are willing to burn per wakeup
+    # sleep: the coarse sleep to calibrate against, a function taking seconds (e.g., time.sleep, or threading.Condition.wait while holding the condition)
+    def __init__(self, spin=None, max_spin=2000000, sleep=time.sleep):
+        self.spin = min(calibrate(sleep), max_spin) if spin is None else spin
+
+    # The part of a sleep of 'duration' ns that should be done coarsely (by the OS or event loop).
+    # resolution: ns by which the coarse sleep may be late on top of the OS, e.g., because the event loop rounds up to whole milliseconds
+    def coarse(self, duration, resolution=0):
+        return max(duration - self.spin - resolution, 0)
+
+    # Busy-wait until the deadline (time.perf_counter_ns()), or until interrupted() returns True
+    # The GIL is only released after sys.getswitchinterval(), which is longer than any sensible spin: other threads wait at most the spin duration.
+    def spin_until(self, deadline, interrupted=lambda: False):
+        while time.perf_counter_ns() < deadline:
+            if interrupted():
+                return
+
+    # Sleep for 'duration' ns, with a coarse sleep(seconds) followed by a spin.
+    # interrupted: checked after the coarse sleep and while spinning, e.g., to return as soon as an input has arrived
+    def wait(self, duration, sleep, interrupted=lambda: False):
+        deadline = time.perf_counter_ns() + duration
+        coarse = self.coarse(duration)
+        if coarse > 0:
+            sleep(coarse / 1000000000) # ns to s
+        self.spin_until(deadline, interrupted)
+
+# Returns how late (ns) sleep(seconds) wakes us up, at worst, over a number of short sleeps
+def calibrate(sleep=time.sleep, samples=CALIBRATION_SAMPLES):
+    worst = 0
+    for _ in range(samples):
+        before = time.perf_counter_ns()
+        sleep(CALIBRATION_SLEEP / 1000000000)
+        worst = max(worst, time.perf_counter_ns() - before - CALIBRATION_SLEEP)
+    return worst
@@ -1,9 +1,13 @@
 from lib.controller import Controller
 from lib.realtime.realtime import WallClock, AbstractRealTimeSimulation
+from lib.realtime.deadline import DeadlineScheduler
 import time
 import abc
 
 class AbstractEventLoop:
+    # ns by which a scheduled callback may be late because of the event loop itself (e.g., rounding)
+    resolution = 0
+
     # delay in nanoseconds
     # should be non-blocking
     # should return timer ID
@@ -17,9 +21,16 @@ class AbstractEventLoop:
 
 # Runs virtual (simulated) time as close as possible to (scaled) wall-clock time.
 # Depending on how fast your computer is, simulated time will always run a tiny bit behind wall-clock time, but this error will NOT grow over time.
+#
+# coalesce_window: by default (None), every call to add_input_now runs the simulation right away (see poke). A burst of inputs (e.g., from a network bridge) then causes as many timer cancellations and run_until calls, which can make a GUI unresponsive.
+#   With coalesce_window = 0, inputs are only added to the event queue, and the simulation runs once, in the next iteration of the event loop, for all inputs that arrived in the meantime.
+#   With coalesce_window > 0 (nanoseconds, wall-clock time), the simulation runs at most that long after an input arrived, for all inputs that arrived in the meantime.
+#   Either way, every input keeps the timestamp of the moment add_input_now was called, and inputs keep their order, so the simulation behaves exactly the same: only its reaction is delayed (by at most the window).
+#
+# deadline_scheduler: a DeadlineScheduler (see lib/realtime/deadline.py) to wake up precisely in time for the next event: the timer is scheduled a bit early, and its callback spins until the deadline, blocking the event loop for at most the spin duration (plus the event loop's resolution).
 class EventLoopRealTimeSimulation(AbstractRealTimeSimulation):
 
-    def __init__(self, controller: Controller, event_loop: AbstractEventLoop, wall_clock: WallClock, termination_condition=lambda: False, time_advance_callback=lambda:None):
+    def __init__(self, controller: Controller, event_loop: AbstractEventLoop, wall_clock: WallClock, termination_condition=lambda: False, time_advance_callback=lambda:None, coalesce_window=None, deadline_scheduler: DeadlineScheduler = None):
         self.controller = controller
         self.event_loop = event_loop
 
@@ -33,10 +44,15 @@ class EventLoopRealTimeSimulation(AbstractRealTimeSimulation):
 
         # At most one timer will be scheduled at the same time
         self.scheduled_id = None
+        self.scheduled_at = None # time.perf_counter_ns() at which the scheduled timer is due
+
+        self.coalesce_window = coalesce_window
+        self.deadline_scheduler = deadline_scheduler
 
     def poke(self):
         if self.scheduled_id is not None:
             self.event_loop.cancel(self.scheduled_id)
+            self.scheduled_id = None
 
         self.controller.run_until(self.wall_clock.time_since_start()) # this call may actually consume some time
 
@@ -49,14 +65,35 @@ class EventLoopRealTimeSimulation(AbstractRealTimeSimulation):
         if self.controller.have_event():
             # schedule next wakeup
             sleep_duration = self.wall_clock.sleep_duration_until(self.controller.get_earliest())
-            self.scheduled_id = self.event_loop.schedule(sleep_duration, self.poke)
+            self.scheduled_at = time.perf_counter_ns() + sleep_duration
+            if self.deadline_scheduler is None:
+                self.scheduled_id = self.event_loop.schedule(sleep_duration, self.poke)
+            else:
+                self.scheduled_id = self.event_loop.schedule(self.deadline_scheduler.coarse(sleep_duration, self.event_loop.resolution), self.spin_then_poke)
             # print("sleeping for", pretty_time(sleep_duration))
         else:
             # print("sleeping until woken up")
             pass
 
+    def spin_then_poke(self):
+        self.deadline_scheduler.spin_until(self.scheduled_at)
+        self.poke()
+
     # generate input event at the current wall clock time
     # this method should be used for generating events that represent e.g., button clicks, key presses
     def add_input_now(self, sc, event, value=None):
         self.controller.add_input(sc, event, timestamp=self.wall_clock.time_since_start(), value=value)
-        self.poke()
+        if self.coalesce_window is None:
+            self.poke()
+        else:
+            self.poke_within(self.coalesce_window)
+
+    # make sure poke is called within 'window' nanoseconds (wall-clock time) from now, without calling it right away
+    def poke_within(self, window):
+        due = time.perf_counter_ns() + window
+        if self.scheduled_id is not None:
+            if self.scheduled_at <= due:
+                return # the scheduled timer will run the simulation soon enough (this is the common case during a burst)
+            self.event_loop.cancel(self.scheduled_id)
+        self.scheduled_id = self.event_loop.schedule(window, self.poke)
+        self.scheduled_at = due
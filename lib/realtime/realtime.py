@@ -1,6 +1,8 @@
 import time
 import abc
 
+from lib.realtime.telemetry import LagTelemetry
+
 # Use time_scale different from 1.0 for scaled real-time execution:
 #   time_scale > 1 speeds up simulation
 #   0 < time_scale < 1 slows down simulation
@@ -8,6 +10,7 @@ class WallClock:
     def __init__(self, time_scale=1.0):
         self.time_scale = time_scale
         self.purposefully_behind = 0
+        self.telemetry = None # LagTelemetry, only when enabled (see AbstractRealTimeSimulation.enable_telemetry)
 
     def record_start_time(self):
         self.start_time = time.perf_counter_ns()
@@ -24,6 +27,8 @@ class WallClock:
         # Like all things fate-related, we embrace this slowness, rather than fighting it:
         # We will temporarily run the simulation at a slower pace, which has the benefit of the simulation remaining responsive to user input.
         self.purposefully_behind   = min(sleep_duration, 0) # see above comment
+        if sleep_duration < 0 and self.telemetry is not None:
+            self.telemetry.record_overrun(now - earliest_event_time)
         actual_sleep_duration      = max(sleep_duration, 0) # can never sleep less than 0
         return actual_sleep_duration
 
@@ -33,3 +38,12 @@ class AbstractRealTimeSimulation:
     @abc.abstractmethod
     def add_input_now(self, sc, event, value=None):
         pass
+
+    # Start measuring how far behind the wall clock the simulation runs (see lib/realtime/telemetry.py).
+    # report_interval: seconds between summaries passed to 'report', or None for no periodic summaries
+    # Returns the LagTelemetry, whose as_dict() or summary() can be called at any time.
+    def enable_telemetry(self, report_interval=None, report=print):
+        telemetry = LagTelemetry(self.wall_clock, report_interval, report)
+        self.controller.input_tracers.append(telemetry.record)
+        self.wall_clock.telemetry = telemetry
+        return telemetry
@@ -0,0 +1,92 @@
+# Lag and jitter telemetry for real-time simulation (see AbstractRealTimeSimulation.enable_telemetry in lib/realtime/realtime.py), e.g., to choose hardware or a safe time_scale.
+#
+# For every dispatched event, the lag is the (scaled) wall-clock time at which it was dispatched, minus its timestamp, i.e., how late the event was.
+# Lags are counted in a histogram with a fixed number of buckets, so memory usage does not grow, no matter how long the simulation runs.
+# Wall-clock time is measured without WallClock.purposefully_behind, so lag includes the time the simulation was purposefully slowed down.
+# Overruns are counted separately: whenever the next event was already in the past when the simulation wanted to go to sleep.
+# All durations are in nanoseconds of simulated time (i.e., scaled wall-clock time): divide by the time scale to get wall-clock time.
+
+import time
+
+# Bucket boundaries: every power of 2 is split in SUB_BUCKETS buckets of equal width, so the error of a percentile is at most 1/SUB_BUCKETS (25%).
+SUB_BITS = 2
+SUB_BUCKETS = 1 << SUB_BITS
+NUM_BUCKETS = (64 - SUB_BITS) * SUB_BUCKETS + SUB_BUCKETS # enough for any lag up to 2**64 ns
+
+def bucket_index(lag):
+    if lag < 2 * SUB_BUCKETS:
+        return max(lag, 0)
+    shift = lag.bit_length() - SUB_BITS - 1
+    return shift * SUB_BUCKETS + (lag >> shift)
+
+# smallest lag counted in bucket 'index'
+def bucket_lower_bound(index):
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (index - shift * SUB_BUCKETS) << shift
+
+class LagTelemetry:
+    # report_interval: seconds (wall-clock time) between summaries passed to 'report', or None for no periodic summaries
+    def __init__(self, wall_clock, report_interval=None, report=print):
+        self.wall_clock = wall_clock
+        self.report_interval_ns = None if report_interval is None else int(report_interval * 1000000000)
+        self.report = report
+        self.buckets = [0] * NUM_BUCKETS
+        self.events = 0
+        self.total_lag = 0
+        self.max_lag = 0
+        self.overruns = 0 # number of times the simulation could not keep up with the wall clock
+        self.total_behind = 0 # cumulative amount the simulation was behind at an overrun (like WallClock.purposefully_behind)
+        self.max_behind = 0
+        self.last_report = time.perf_counter_ns()
+
+    # To be added to Controller.input_tracers: called for every dispatched event, right before it is dispatched
+    def record(self, simtime, event_name, value):
+        now = time.perf_counter_ns()
+        lag = int((now - self.wall_clock.start_time) * self.wall_clock.time_scale - simtime)
+        self.buckets[bucket_index(lag)] += 1
+        self.events += 1
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if self.report_interval_ns is not None and now - self.last_report >= self.report_interval_ns:
+            self.last_report = now
+            self.report(self.summary())
+
+    # Called by WallClock.sleep_duration_until, with the amount by which the next event was overdue
+    def record_overrun(self, behind):
+        self.overruns += 1
+        self.total_behind += behind
+        if behind > self.max_behind:
+            self.max_behind = behind
+
+    # Approximate lag (ns) below which p percent of all events were dispatched
+    def percentile(self, p):
+        threshold = self.events * p / 100
+        count = 0
+        for index, n in enumerate(self.buckets):
+            count += n
+            if n and count >= threshold:
+                return bucket_lower_bound(index)
+        return 0
+
+    def as_dict(self):
+        return {
+            "events": self.events,
+            "mean_lag_ns": self.total_lag // self.events if self.events else 0,
+            "p50_lag_ns": self.percentile(50),
+            "p99_lag_ns": self.percentile(99),
+            "p999_lag_ns": self.percentile(99.9),
+            "max_lag_ns": self.max_lag,
+            "overruns": self.overruns,
+            "total_behind_ns": self.total_behind,
+            "max_behind_ns": self.max_behind,
+            # bucket lower bound (ns) -> number of events, only for non-empty buckets
+            "histogram": {bucket_lower_bound(index): n for index, n in enumerate(self.buckets) if n},
+        }
+
+    def summary(self):
+        d = self.as_dict()
+        return (f"real-time lag (simulated time): {d['events']} events, mean {d['mean_lag_ns'] / 1000000:.3f} ms, p50 {d['p50_lag_ns'] / 1000000:.3f} ms, p99 {d['p99_lag_ns'] / 1000000:.3f} ms, max {d['max_lag_ns'] / 1000000:.3f} ms, "
+            f"{d['overruns']} overruns ({d['total_behind_ns'] / 1000000:.3f} ms behind in total, at most {d['max_behind_ns'] / 1000000:.3f} ms)")
@@ -1,6 +1,8 @@
 import threading
+from collections import deque
 
 from lib.realtime.realtime import WallClock, AbstractRealTimeSimulation
+from lib.realtime.deadline import DeadlineScheduler
 from lib.controller import Controller, pretty_time
 
 # Runs simulation, real-time, in its own thread
@@ -10,15 +12,25 @@ from lib.controller import Controller, pretty_time
 #      target=ThreadedRealTimeSimulation(...).mainloop,
 #   )
 #   thread.start()
+#
+# Any number of threads (e.g., I/O threads) can call add_input_now at the same time.
+# Inputs are not added to the Controller directly: they are appended to an inbox (a deque, which is thread-safe without locks), which the simulation thread empties at the start of every iteration of its mainloop. Only the simulation thread ever touches the Controller.
+# The lock is only taken to wake up the simulation thread, and only when it is sleeping.
+#
+# deadline_scheduler: a DeadlineScheduler (see lib/realtime/deadline.py) to wake up precisely in time for the next event, instead of relying on threading.Condition.wait alone
 class ThreadedRealTimeSimulation(AbstractRealTimeSimulation):
-    def __init__(self, controller: Controller, wall_clock: WallClock, termination_condition = lambda: False):
+    def __init__(self, controller: Controller, wall_clock: WallClock, termination_condition = lambda: False, deadline_scheduler: DeadlineScheduler = None):
         self.controller = controller
         self.wall_clock = wall_clock
         self.termination_condition = termination_condition
         self.condition = threading.Condition()
+        self.inbox = deque() # (timestamp, sc, event_id, value)-tuples
+        self.sleeping = False # only changed while holding self.condition
+        self.deadline_scheduler = deadline_scheduler
 
     def mainloop(self):
         while True:
+            self.drain_inputs()
             self.controller.run_until(self.wall_clock.time_since_start())
             if self.termination_condition():
                 print("Termination condition satisfied. Stop mainloop.")
@@ -26,18 +38,41 @@ class ThreadedRealTimeSimulation(AbstractRealTimeSimulation):
             if self.controller.have_event():
                 earliest_event_time = self.controller.get_earliest()
                 sleep_duration = self.wall_clock.sleep_duration_until(earliest_event_time)
-                with self.condition:
-                    # print('thread sleeping for', pretty_time(sleep_duration), 'or until interrupted')
-                    self.condition.wait(sleep_duration / 1000000000)
-                    # print('thread woke up')
+                # print('thread sleeping for', pretty_time(sleep_duration), 'or until interrupted')
+                if self.deadline_scheduler is None:
+                    self.sleep(sleep_duration / 1000000000)
+                else:
+                    self.deadline_scheduler.wait(sleep_duration, self.sleep, lambda: self.inbox)
+                # print('thread woke up')
             else:
-                with self.condition:
-                    # print('thread sleeping until interrupted')
-                    self.condition.wait()
+                # print('thread sleeping until interrupted')
+                self.sleep(None)
 
-    def add_input_now(self, sc, event, value=None):
+    # timeout: seconds, or None to sleep until interrupted
+    def sleep(self, timeout):
         with self.condition:
-            self.controller.add_input(sc, event,
-                timestamp=self.wall_clock.time_since_start(),
-                value=value)
-            self.condition.notify()
+            self.sleeping = True
+            # An input that was added before 'sleeping' was set, did not notify us:
+            if not self.inbox:
+                self.condition.wait(timeout)
+            self.sleeping = False
+
+    def drain_inputs(self):
+        inbox = self.inbox
+        controller = self.controller
+        # Only the inputs that are already there: with busy producers, the inbox may never be empty, but we also need to run the simulation.
+        for _ in range(len(inbox)):
+            (timestamp, sc, event_id, value) = inbox.popleft()
+            # In the meantime, the simulation may have advanced beyond the moment the input was made. Simulated time cannot go back:
+            controller.add_input_id(sc, event_id, max(timestamp, controller.simulated_time), value)
+
+    def add_input_now(self, sc, event, value=None):
+        # Unknown event names are reported to the caller, not to the simulation thread:
+        self.add_input_id_now(sc, self.controller.input_event_id(sc, event), value)
+
+    # Same as add_input_now, but with the event identified by its ID (see Controller.input_event_id)
+    def add_input_id_now(self, sc, event_id, value=None):
+        self.inbox.append((self.wall_clock.time_since_start(), sc, event_id, value))
+        if self.sleeping:
+            with self.condition:
+                self.condition.notify()
@@ -1,12 +1,17 @@
+import math
+
 from lib.realtime.event_loop import AbstractEventLoop
 
 # schedules calls in an existing tkinter eventloop
 class TkEventLoopAdapter(AbstractEventLoop):
+    resolution = 1000000 # Tk only knows whole milliseconds
+
     def __init__(self, tk):
         self.tk = tk
 
     def schedule(self, delay, callback):
-        return self.tk.after(int(delay / 1000000), # ns to ms
+        # Round up: a callback that comes too early does not find the event it was scheduled for, and has to reschedule (possibly over and over again, with delay 0)
+        return self.tk.after(math.ceil(delay / 1000000), # ns to ms (an int, also for a float delay: Tcl only accepts integers)
             callback)
 
     def cancel(self, timer):
@@ -0,0 +1,108 @@
+# Checkpointing of running simulations, e.g., for what-if analysis:
+# run a common prefix once, take a snapshot, and then restore (or fork) the snapshot for every variation, instead of re-running the prefix from t=0.
+#
+# A snapshot includes everything reachable from the objects it is taken of: typically the Controller (event queue, simulated time), the Statechart (state vector, internal variables), the timer service adapter, the tracer, and the fake components (which are reachable via the Statechart's observables).
+# Snapshots should be taken in between calls to Controller.run_until, never from within an event handler.
+# Things that cannot be copied: lambdas and local functions (e.g., as callbacks), open files, generators (such as input streams), GUIs.
+# Interpreted statecharts (lib/interpreter.py) are restored through their model file (see Statechart.__reduce__ there): a snapshot that is saved to disk and loaded in another process needs the same model file.
+
+import copyreg
+import io
+import os
+import pickle
+import queue
+import sys
+
+# The generated Statechart uses a queue.Queue for its internal events, which cannot be pickled because of its locks.
+# Only its items (usually none, in between run-to-completion steps) need to be pickled.
+def make_queue(items):
+    q = queue.Queue()
+    for item in items:
+        q.put(item)
+    return q
+
+def reduce_queue(q):
+    return (make_queue, (list(q.queue),))
+
+# Pickles queue.Queues as above, without changing how they are pickled elsewhere in the process (as copyreg.pickle would)
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        self.dispatch_table[queue.Queue] = reduce_queue
+
+def dumps(obj):
+    f = io.BytesIO()
+    SnapshotPickler(f).dump(obj)
+    return f.getvalue()
+
+
+class Snapshot:
+    # Typical usage:
+    #   snapshot = Snapshot(controller, sc, tracer)
+    #   ...
+    #   controller, sc, tracer = snapshot.restore()
+    def __init__(self, *objects):
+        self.data = dumps(objects)
+
+    # Returns fresh copies of the objects the snapshot was taken of, in the same order.
+    # Can be called any number of times: every call gives an independent copy.
+    def restore(self):
+        return pickle.loads(self.data)
+
+    # size in bytes
+    def size(self):
+        return len(self.data)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+    @staticmethod
+    def load(path):
+        snapshot = Snapshot()
+        with open(path, 'rb') as f:
+            snapshot.data = f.read()
+        return snapshot
+
+
+# Copy-on-write alternative to Snapshot (Unix only): forks the current process, and calls 'branch' in the child process.
+# The child shares all memory with the parent (until it is written to), so this is nearly free, regardless of the size of the simulation.
+# The return value of 'branch' (which must be picklable) is sent back to the parent, who waits for it. The state of the parent is not affected.
+def run_forked(branch):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child: whatever happens, it must never return from run_forked, or it would continue running the caller's code as a duplicate process
+        exit_code = 1
+        try:
+            os.close(read_fd)
+            try:
+                result = (True, branch())
+            except BaseException as e:
+                result = (False, e)
+            try:
+                data = dumps(result)
+            except Exception as e:
+                data = dumps((False, RuntimeError(f"Result of forked branch cannot be pickled: {e!r}")))
+            with os.fdopen(write_fd, 'wb') as f:
+                f.write(data)
+            exit_code = 0
+        finally:
+            try:
+                # os._exit does not flush, so anything the branch printed would be lost:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_code)
+    # parent
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError("Forked branch exited without a result")
+    ok, result = pickle.loads(data)
+    if not ok:
+        raise result
+    return result
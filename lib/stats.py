@@ -0,0 +1,76 @@
+# Statistics and profiling information collected by Controller.run_until.
+# Only collected while enabled (see Controller.enable_stats), otherwise there is no overhead at all.
+
+import json
+import time
+
+class ControllerStats:
+    def __init__(self, controller):
+        self.controller = controller
+        self.events_dispatched = 0
+        self.event_counts = {} # event name -> number of times dispatched
+        self.raise_time = {} # event name -> cumulative wall-clock time (ns) spent in the raise method, i.e., in the statechart's run-to-completion step and the observers of its output events
+        self.tracer_time = 0 # cumulative wall-clock time (ns) spent in input tracers
+        self.run_until_time = 0 # cumulative wall-clock time (ns) spent in run_until
+        self.canceled_skipped_at_start = controller.canceled_skipped
+
+    def record(self, event_name, raise_time):
+        self.events_dispatched += 1
+        try:
+            self.event_counts[event_name] += 1
+            self.raise_time[event_name] += raise_time
+        except KeyError:
+            self.event_counts[event_name] = 1
+            self.raise_time[event_name] = raise_time
+
+    def as_dict(self):
+        total_raise_time = sum(self.raise_time.values())
+        return {
+            "events_dispatched": self.events_dispatched,
+            "canceled_skipped": self.controller.canceled_skipped - self.canceled_skipped_at_start,
+            "run_until_time_ns": self.run_until_time,
+            "raise_time_ns": total_raise_time,
+            "tracer_time_ns": self.tracer_time,
+            # everything else that happens in run_until: mostly the event queue
+            "queue_time_ns": self.run_until_time - total_raise_time - self.tracer_time,
+            "events": {
+                event_name: {
+                    "count": count,
+                    "raise_time_ns": self.raise_time[event_name],
+                } for event_name, count in sorted(self.event_counts.items())
+            },
+            "queue": self.controller.queue_stats(),
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+
+# The instrumented version of Controller.run_until
+def run_until_instrumented(controller, stats, until):
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    while True:
+        tup = controller.peek_live()
+        if tup is None or tup[0] > until:
+            break
+        controller.event_queue.pop()
+        e = tup[2]
+        e.queued = False
+        if controller.input_tracers:
+            before_tracers = perf_counter_ns()
+            for tracer in controller.input_tracers:
+                tracer(e.timestamp, e.event_name, e.value)
+            stats.tracer_time += perf_counter_ns() - before_tracers
+        controller.simulated_time = e.timestamp
+        before_raise = perf_counter_ns()
+        if e.value == None:
+            e.raise_method()
+        else:
+            e.raise_method(e.value)
+        stats.record(e.event_name, perf_counter_ns() - before_raise)
+    stats.run_until_time += perf_counter_ns() - start
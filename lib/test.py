@@ -1,5 +1,14 @@
 # from yakindu.rx import Observable, Observer
-from difflib import ndiff
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import time
+
+from lib.trace_diff import TraceDiff, event_key
 
 # Can we ignore event in 'trace' at position 'idx' with respect to idempotency?
 def can_ignore(trace, idx, IDEMPOTENT):
@@ -24,7 +33,55 @@ def can_ignore(trace, idx, IDEMPOTENT):
                 break
     return False
 
+# Prepends the events that set the assumed initial state, and removes the events that have no effect (see can_ignore).
+# Same result as postprocess_trace_reference, in linear time:
+# can_ignore only looks at the previous and next event with the same name, so the events of every idempotent event name are kept in a linked list. Every round removes all events that can be ignored at once (like the reference), after which only their neighbours need to be checked again.
 def postprocess_trace(trace, INITIAL, IDEMPOTENT):
+    result = [(0, event_name, value) for (event_name, value) in INITIAL] + list(trace)
+    if any(result[i][0] > result[i+1][0] for i in range(len(result) - 1)):
+        # The 'same timestamp' rule of can_ignore depends on the order of events with different names, which we only take into account for traces sorted by timestamp:
+        return postprocess_trace_reference(trace, INITIAL, IDEMPOTENT)
+    idempotent = set(IDEMPOTENT)
+    prev_same = [-1] * len(result) # index of previous event with the same (idempotent) name, or -1
+    next_same = [-1] * len(result) # index of next event with the same (idempotent) name, or -1
+    last = {} # event name -> index of last event with that name
+    for idx, (_, event_name, _) in enumerate(result):
+        if event_name in idempotent:
+            p = last.get(event_name, -1)
+            prev_same[idx] = p
+            if p >= 0:
+                next_same[p] = idx
+            last[event_name] = idx
+
+    def can_be_ignored(idx):
+        (timestamp, _, value) = result[idx]
+        p = prev_same[idx]
+        if p >= 0:
+            earlier_value = result[p][2]
+            if earlier_value is value or earlier_value == value:
+                return True
+        n = next_same[idx]
+        return n >= 0 and result[n][0] == timestamp
+
+    removed = [False] * len(result)
+    candidates = [idx for idx in range(len(result)) if result[idx][1] in idempotent]
+    while candidates:
+        ignored = [idx for idx in candidates if can_be_ignored(idx)]
+        affected = set()
+        for idx in ignored:
+            removed[idx] = True
+            p, n = prev_same[idx], next_same[idx]
+            if p >= 0:
+                next_same[p] = n
+                affected.add(p)
+            if n >= 0:
+                prev_same[n] = p
+                affected.add(n)
+        candidates = sorted(idx for idx in affected if not removed[idx])
+    return [tup for (idx, tup) in enumerate(result) if not removed[idx]]
+
+# Straightforward, but (more than) quadratic implementation of postprocess_trace
+def postprocess_trace_reference(trace, INITIAL, IDEMPOTENT):
     # Prepend trace with events that set assumed initial state:
     result = [(0, event_name, value) for (event_name, value) in INITIAL] + trace
     # Remove events that have no effect:
@@ -53,15 +110,17 @@ def compare_traces(expected, actual):
     print("Traces match.")
     return True
 
-def run_scenario(input_trace, expected_output_trace, setup, INITIAL, IDEMPOTENT, verbose=False):
+# If the traces are this short (or shorter), the full diff of a failed scenario is printed by default
+FULL_DIFF_MAX_EVENTS = 1000
+
+# full_diff: print the full diff of a failed scenario, or only where the traces first diverge (and how much they differ). None: only for short traces.
+def run_scenario(input_trace, expected_output_trace, setup, INITIAL, IDEMPOTENT, verbose=False, full_diff=None):
     controller, sc, tracer = setup()
 
     # No fake/mock components, the input trace contains everything the Statechart needs!
 
     # Put entire input trace in event queue, ready to go!
-    for tup in input_trace:
-        (timestamp, event_name, value) = tup
-        controller.add_input(sc, event_name, timestamp, value)
+    controller.add_inputs(sc, input_trace)
 
     sc.enter() # enter default state(s)
     
@@ -81,35 +140,20 @@ def run_scenario(input_trace, expected_output_trace, setup, INITIAL, IDEMPOTENT,
     clean_expected = expected_output_trace
     clean_actual   = actual_output_trace
 
-    def print_diff():
+    def print_diff(diff):
         # The diff printed will be a diff of the 'raw' traces, not of the cleaned up traces
         # A diff of the cleaned up traces would be confusing to the user.
-        have_plus = False
-        have_minus = False
+        have_plus = diff.unexpected > 0
+        have_minus = diff.missing > 0
         have_useless = False
-        for diffline in ndiff(
-                [str(tup)+'\n' for tup in expected_output_trace],
-                [str(tup)+'\n' for tup in actual_output_trace],
-                charjunk=None,
-            ):
-            symbol = diffline[0]
-            if symbol == '+':
-                have_plus = True
-            if symbol == '-':
-                have_minus = True
-            if symbol == '?':
-                continue
-            rest = diffline[2:-1] # drop last character (=newline)
-            useless_line = (
-                   symbol == '-' and rest not in [str(tup) for tup in clean_expected]
-                or symbol == '+' and rest not in [str(tup) for tup in clean_actual]
-                # or symbol == ' ' and rest not in [str(tup) for tup in clean_actual]
-            )
+        clean = {'-': set(map(event_key, clean_expected)), '+': set(map(event_key, clean_actual))}
+        for (symbol, event) in diff.ops:
+            useless_line = symbol != ' ' and event_key(event) not in clean[symbol]
             if useless_line:
-                print(" (%s) %s" % (symbol, rest))
+                print(" (%s) %s" % (symbol, event))
                 have_useless = True
             else:
-                print("  %s  %s" % (symbol, rest))
+                print("  %s  %s" % (symbol, event))
 
         if have_minus or have_plus or have_useless:
             print("Legend:")
@@ -122,9 +166,124 @@ def run_scenario(input_trace, expected_output_trace, setup, INITIAL, IDEMPOTENT,
             print("\n\"Useless events\" are ignored by the comparison algorithm, and will never cause your test to fail. In this assignment, your solution is allowed to contain useless events.")
 
     if not compare_traces(clean_expected, clean_actual):
-        print("Raw diff between expected and actual output event trace:")
-        print_diff()
+        diff = TraceDiff(expected_output_trace, actual_output_trace)
+        print(diff.summary(expected_output_trace, actual_output_trace))
+        if full_diff is None:
+            full_diff = max(len(expected_output_trace), len(actual_output_trace)) <= FULL_DIFF_MAX_EVENTS
+        if full_diff:
+            print("Raw diff between expected and actual output event trace:")
+            print_diff(diff)
+        else:
+            print("(Traces are long: run with full_diff=True for the full diff.)")
         return False
     elif verbose:
-        print_diff()
+        print_diff(TraceDiff(expected_output_trace, actual_output_trace))
     return True
+
+
+# Runs a single scenario (dict with "name", "input_events" and "output_events"), capturing everything it prints.
+# Returns the result as a dict, which can be sent back from a worker process.
+def run_scenario_captured(scenario, setup, INITIAL, IDEMPOTENT, verbose=False, full_diff=None):
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        ok = run_scenario(scenario["input_events"], scenario["output_events"], setup, INITIAL, IDEMPOTENT, verbose, full_diff)
+    return {
+        "name": scenario["name"],
+        "ok": ok,
+        "duration": time.perf_counter() - start,
+        "output": output.getvalue(), # includes the diff, if the scenario failed
+    }
+
+# Runs scenarios in a pool of worker processes. Every worker calls 'setup' for every scenario, so 'setup' must be picklable (e.g., a module-level function, or a functools.partial of one).
+# Returns the results (see run_scenario_captured) in the same order as 'scenarios'.
+def run_scenarios_parallel(scenarios, setup, INITIAL, IDEMPOTENT, processes=None, verbose=False, full_diff=None):
+    processes = processes or os.cpu_count() or 1
+    run = functools.partial(run_scenario_captured, setup=setup, INITIAL=INITIAL, IDEMPOTENT=IDEMPOTENT, verbose=verbose, full_diff=full_diff)
+    # Send scenarios in chunks, to amortize inter-process communication over many (typically small) scenarios:
+    chunksize = max(1, len(scenarios) // (processes * 4))
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(run, scenarios, chunksize=chunksize))
+
+
+# Runs scenarios, skipping those whose result is already in 'cache' (a ScenarioResultCache, or None for no caching).
+# processes: 1 to run the scenarios in this process, otherwise see run_scenarios_parallel
+# force: run all scenarios again (and update the cache)
+# Returns the results (see run_scenario_captured) in the same order as 'scenarios', with an extra "cached" entry.
+def run_scenarios(scenarios, setup, INITIAL, IDEMPOTENT, processes=1, verbose=False, full_diff=None, cache=None, force=False):
+    keys = [cache.key(scenario, INITIAL, IDEMPOTENT, verbose, full_diff) if cache else None for scenario in scenarios]
+    results = [None] * len(scenarios)
+    if cache and not force:
+        for i, (scenario, key) in enumerate(zip(scenarios, keys)):
+            result = cache.get(key)
+            if result is not None:
+                results[i] = dict(result, name=scenario["name"], cached=True)
+    todo = [i for i, result in enumerate(results) if result is None]
+    if processes == 1 or not todo:
+        fresh = [run_scenario_captured(scenarios[i], setup, INITIAL, IDEMPOTENT, verbose, full_diff) for i in todo]
+    else:
+        fresh = run_scenarios_parallel([scenarios[i] for i in todo], setup, INITIAL, IDEMPOTENT, processes, verbose, full_diff)
+    for i, result in zip(todo, fresh):
+        if cache:
+            cache.put(keys[i], result)
+        results[i] = dict(result, cached=False)
+    return results
+
+# Content-addressed cache of scenario results: a scenario only needs to run again if its input or expected output trace changed, or the code that runs it, or the settings used to compare the traces.
+# directory: where the results are stored, one small JSON file per result
+# code_paths: files and directories (all *.py files in it, recursively) of the code under test, e.g., srcgen/statechart.py and lib/
+# settings: anything else that may change the outcome (e.g., options passed to 'setup'), with a deterministic repr
+# Results are only valid as long as running a scenario is deterministic, which it is for simulated time.
+class ScenarioResultCache:
+    def __init__(self, directory, code_paths, settings=None):
+        self.directory = directory
+        h = hashlib.sha256()
+        for path in source_files(code_paths):
+            h.update(path.encode())
+            h.update(b'\0')
+            with open(path, 'rb') as f:
+                h.update(f.read())
+            h.update(b'\0')
+        h.update(repr(settings).encode())
+        self.code_hash = h.hexdigest()
+
+    def key(self, scenario, INITIAL, IDEMPOTENT, verbose=False, full_diff=None):
+        h = hashlib.sha256(self.code_hash.encode())
+        # The name of a scenario does not change its outcome:
+        h.update(repr((scenario["input_events"], scenario["output_events"], INITIAL, IDEMPOTENT, verbose, full_diff)).encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    # Returns the cached result, or None
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # If the cache cannot be written (e.g., read-only file system), the scenario will simply run again next time.
+    def put(self, key, result):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first, so that concurrent test runs never see a partially written result:
+            tmp = f"{self.path(key)}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"ok": result["ok"], "duration": result["duration"], "output": result["output"]}, f)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            pass
+
+# All source files in 'paths' (files, or directories to search for *.py files), in a deterministic order
+def source_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories[:] = [d for d in subdirectories if d != '__pycache__']
+                files.extend(os.path.join(directory, name) for name in names if name.endswith('.py'))
+        elif os.path.exists(path):
+            files.append(path)
+    return sorted(files)
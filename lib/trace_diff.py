@@ -0,0 +1,205 @@
+# Diff of two event traces (lists of (timestamp, event_name, value)-tuples), for reporting failed tests (see lib/test.py).
+#
+# Events are compared as tuples (like compare_traces in lib/test.py), not as strings.
+# Recorded traces are sorted by timestamp, and two events can only match if their timestamps are equal. Hence, the traces can be aligned one timestamp at a time: only the (typically very few) events with the same timestamp are aligned with Myers' diff algorithm. This takes linear time, even for traces with millions of events.
+# Traces that are not sorted by timestamp are aligned as a whole, with Myers' algorithm, which takes O((N+M)*D) time and O(N+M) memory for a difference of D events.
+
+# Maximal number of differing events that Myers' algorithm looks for. Beyond that, the remaining events are reported as all missing and all unexpected (a correct, but not minimal diff).
+# Memory is linear, but time grows with D**2: a difference of 2000 events takes a few seconds.
+MAX_EDIT_DISTANCE = 2000
+
+# Returns list of (symbol, event), with symbol:
+#   ' ' event occurs in both traces
+#   '-' expected, but did not happen
+#   '+' happened, but was not expected
+def diff_traces(expected, actual, max_edit_distance=MAX_EDIT_DISTANCE):
+    if is_sorted(expected) and is_sorted(actual):
+        return diff_sorted_traces(expected, actual, max_edit_distance)
+    # Intern events, so that Myers' algorithm only compares integers:
+    ids = {}
+    a = [ids.setdefault(event_key(event), len(ids)) for event in expected]
+    b = [ids.setdefault(event_key(event), len(ids)) for event in actual]
+    # Common prefix and suffix are cheap to find, and usually most of the trace:
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1-suffix] == b[-1-suffix]:
+        suffix += 1
+    ops = [(' ', event) for event in expected[:prefix]]
+    ops.extend(diff_events(expected[prefix:len(expected)-suffix], actual[prefix:len(actual)-suffix], a[prefix:len(a)-suffix], b[prefix:len(b)-suffix], max_edit_distance))
+    ops.extend((' ', event) for event in expected[len(expected)-suffix:])
+    return ops
+
+# Events are tuples, but their values can be anything (e.g., a list): events that cannot be hashed are represented by their repr
+def event_key(event):
+    try:
+        hash(event)
+        return event
+    except TypeError:
+        return (UNHASHABLE, repr(event))
+
+UNHASHABLE = object()
+
+def is_sorted(trace):
+    return all(trace[i][0] <= trace[i+1][0] for i in range(len(trace) - 1))
+
+def diff_sorted_traces(expected, actual, max_edit_distance):
+    ops = []
+    i, j = 0, 0
+    while i < len(expected) or j < len(actual):
+        if j == len(actual) or (i < len(expected) and expected[i][0] <= actual[j][0]):
+            timestamp = expected[i][0]
+        else:
+            timestamp = actual[j][0]
+        # The events at this timestamp:
+        i_end = i
+        while i_end < len(expected) and expected[i_end][0] == timestamp:
+            i_end += 1
+        j_end = j
+        while j_end < len(actual) and actual[j_end][0] == timestamp:
+            j_end += 1
+        a, b = expected[i:i_end], actual[j:j_end]
+        if a == b:
+            ops.extend((' ', event) for event in a)
+        else:
+            ops.extend(diff_events(a, b, a, b, max_edit_distance))
+        i, j = i_end, j_end
+    return ops
+
+# Diff of event lists a and b, with keys (equal for equal events) a_keys and b_keys
+def diff_events(a, b, a_keys, b_keys, max_edit_distance):
+    path = myers(a_keys, b_keys, max_edit_distance)
+    if path is None:
+        return [('-', event) for event in a] + [('+', event) for event in b]
+    return [(' ', a[x]) if symbol == ' ' else ('-', a[x]) if symbol == '-' else ('+', b[y]) for (symbol, x, y) in path]
+
+# Myers' O((N+M)*D) diff algorithm ("An O(ND) Difference Algorithm and Its Variations", 1986), in its linear space variant: the 'middle snake' of the shortest edit script is found by searching forward and backward at the same time, and the parts before and after it are diffed in the same way.
+# Only O(D) memory is needed, even for large edit distances D (the basic variant keeps the frontier of every step, which takes O(D^2) memory).
+# Returns the shortest edit script as a list of (symbol, x, y), with x and y the positions in a and b, or None if it is longer than max_edit_distance.
+def myers(a, b, max_edit_distance):
+    n, m = len(a), len(b)
+    path = []
+    # Ranges (a_lo, a_hi, b_lo, b_hi) still to be diffed, and snakes (None, x, y, length) still to be added to the path, in reverse order:
+    todo = [(0, n, 0, m)]
+    # The middle snake of the entire range, which also tells us whether the edit script is short enough:
+    first = None
+    if n and m:
+        first = middle_snake(a, b, 0, n, 0, m, max_edit_distance)
+        if first is None:
+            return None
+    elif n + m > max_edit_distance:
+        return None
+    while todo:
+        item = todo.pop()
+        if item[0] is None:
+            _, x, y, length = item
+            path.extend((' ', x + i, y + i) for i in range(length))
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+        if a_lo == a_hi:
+            path.extend(('+', a_lo, y) for y in range(b_lo, b_hi))
+        elif b_lo == b_hi:
+            path.extend(('-', x, b_lo) for x in range(a_lo, a_hi))
+        else:
+            if first is not None:
+                d, x, y, u, v = first
+                first = None
+            else:
+                d, x, y, u, v = middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, a_hi - a_lo + b_hi - b_lo)
+            if d <= 1:
+                # At most one difference: match the common prefix, then insert or delete one event, and match the rest
+                x, y = a_lo, b_lo
+                while x < a_hi and y < b_hi and a[x] == b[y]:
+                    path.append((' ', x, y))
+                    x += 1
+                    y += 1
+                if a_hi - a_lo > b_hi - b_lo:
+                    path.append(('-', x, y))
+                    x += 1
+                elif a_hi - a_lo < b_hi - b_lo:
+                    path.append(('+', x, y))
+                    y += 1
+                path.extend((' ', x + i, y + i) for i in range(a_hi - x))
+            else:
+                todo.append((u, a_hi, v, b_hi))
+                todo.append((None, x, y, u - x))
+                todo.append((a_lo, x, b_lo, y))
+    return path
+
+# Finds the middle snake of the shortest edit script of a[a_lo:a_hi] and b[b_lo:b_hi].
+# Returns (D, x, y, u, v): the length D of the shortest edit script, and the snake (a diagonal of matching events) from (x, y) to (u, v), or None if D > max_edit_distance.
+def middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_edit_distance):
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    forward = {1: 0} # diagonal k -> furthest x reached on it, from the start
+    backward = {1: 0} # diagonal k -> furthest x reached on it, from the end (in reversed coordinates)
+    for d in range((min(n + m, max_edit_distance) + 1) // 2 + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k-1] < forward[k+1]):
+                x = forward[k+1] # insertion
+            else:
+                x = forward[k-1] + 1 # deletion
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            # Overlaps with the backward search of the previous step?
+            if odd and delta - d < k < delta + d and x + backward[delta - k] >= n:
+                if 2 * d - 1 > max_edit_distance:
+                    return None
+                return (2 * d - 1, a_lo + start_x, b_lo + start_y, a_lo + x, b_lo + y)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[k-1] < backward[k+1]):
+                x = backward[k+1]
+            else:
+                x = backward[k-1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            backward[k] = x
+            # Overlaps with the forward search of this step?
+            if not odd and -d <= delta - k <= d and x + forward[delta - k] >= n:
+                if 2 * d > max_edit_distance:
+                    return None
+                return (2 * d, a_hi - x, b_hi - y, a_hi - start_x, b_hi - start_y)
+    return None
+
+# Summary of a diff: where the traces first diverge, and how many events differ.
+class TraceDiff:
+    def __init__(self, expected, actual, max_edit_distance=MAX_EDIT_DISTANCE):
+        self.expected_length = len(expected)
+        self.actual_length = len(actual)
+        self.ops = diff_traces(expected, actual, max_edit_distance)
+        self.missing = sum(1 for (symbol, _) in self.ops if symbol == '-')
+        self.unexpected = sum(1 for (symbol, _) in self.ops if symbol == '+')
+        self.matched = len(self.ops) - self.missing - self.unexpected
+        # position of first divergence in the expected and actual trace, or None if the traces are equal
+        self.first_divergence = None
+        i, j = 0, 0
+        for (symbol, _) in self.ops:
+            if symbol != ' ':
+                self.first_divergence = (i, j)
+                break
+            i += 1
+            j += 1
+
+    def __bool__(self):
+        return self.first_divergence is not None
+
+    def summary(self, expected, actual):
+        if self.first_divergence is None:
+            return "Traces are equal."
+        i, j = self.first_divergence
+        lines = [
+            f"First divergence after {i} matching events:",
+            f"  expected: {expected[i] if i < len(expected) else '(end of trace)'}",
+            f"  actual:   {actual[j] if j < len(actual) else '(end of trace)'}",
+            f"Expected {self.expected_length} events, got {self.actual_length}: {self.matched} matching, {self.missing} missing (-), {self.unexpected} unexpected (+).",
+        ]
+        return "\n".join(lines)
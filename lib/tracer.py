@@ -1,4 +1,12 @@
+import json
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+
 from lib.controller import pretty_time
+from lib.binary_trace import BinaryTraceWriter
 
 # Records input/output events
 class Tracer:
@@ -19,18 +27,451 @@ class Tracer:
             print(f"time = {pretty_time(simtime)}, output event: {event_name}, value = {value}")
         self.output_events.append( (simtime, event_name, value))
 
+    # Returns a sink for lib.yakindu_helpers.OutputEventMultiplexer, i.e., a function (event_id, value) that records output events in this tracer.
+    # names: event ID -> event name (see lib.yakindu_helpers.OutputEventRegistry)
+    # Verbosity is fixed when the sink is created.
+    def output_event_sink(self, controller, names):
+        if self.verbose:
+            return OutputEventSink(controller, names, None, self.record_output_event).record_callback
+        return OutputEventSink(controller, names, None, self.output_events).record
+
+
+# Records input/output events of a fleet of statechart instances (see lib/fleet.py)
+# Every event is recorded as (simtime, instance, event_name, value), with 'instance' the index of the statechart instance in the fleet.
+class FleetTracer:
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.input_events = []
+        self.output_events = []
+
+    def record_input_event(self, instance, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, instance {instance}, input event: {event_name}, value = {value}")
+        self.input_events.append( (simtime, instance, event_name, value) )
+
+    def record_output_event(self, instance, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, instance {instance}, output event: {event_name}, value = {value}")
+        self.output_events.append( (simtime, instance, event_name, value) )
+
+    # Same as Tracer.output_event_sink, for the statechart instance with the given index
+    def output_event_sink(self, controller, names, instance):
+        if self.verbose:
+            return OutputEventSink(controller, names, instance, self.record_output_event).record_callback
+        return OutputEventSink(controller, names, instance, self.output_events).record_instance
+
+    # Get the trace of a single instance, in the same format as Tracer.input_events/output_events
+    def instance_trace(self, trace, instance):
+        return [(simtime, event_name, value) for (simtime, i, event_name, value) in trace if i == instance]
+
+
+# Records output events that come from an OutputEventMultiplexer, with a single Python function call per event (For MAXIMUM performance :)
+# A class with bound methods rather than a closure, so that it can be pickled (see lib/snapshot.py)
+class OutputEventSink:
+    __slots__ = ('controller', 'names', 'instance', 'target')
+
+    # target: list to append events to, or (for record_callback) the tracer's record_output_event method
+    def __init__(self, controller, names, instance, target):
+        self.controller = controller
+        self.names = names
+        self.instance = instance
+        self.target = target
+
+    def record(self, event_id, value=None):
+        self.target.append( (self.controller.simulated_time, self.names[event_id], value) )
+
+    def record_instance(self, event_id, value=None):
+        self.target.append( (self.controller.simulated_time, self.instance, self.names[event_id], value) )
+
+    def record_callback(self, event_id, value=None):
+        if self.instance is None:
+            self.target(self.controller.simulated_time, self.names[event_id], value)
+        else:
+            self.target(self.instance, self.controller.simulated_time, self.names[event_id], value)
+
+
+# Compact, column-wise storage of a trace, for long runs (e.g., day-long real-time runs, or fleets): instead of a tuple per event, every event takes 20 bytes or so:
+#   timestamps   typed array of int64
+#   kinds        bytearray, one kind (see below) per timestamp, only once a timestamp that is not an int64 has been recorded (e.g., a float, in real-time simulation)
+#   event_ids    typed array of uint32, IDs of interned event names (see EventNames)
+#   values       list, mostly references to the same None object
+#   instances    typed array of uint32, only for fleet traces
+# Indexing and iterating gives the same tuples as the list-based tracers, with the same timestamps (no conversion of ints to floats or vice versa). to_list() converts back to such a list.
+class TraceColumns:
+    def __init__(self, names, with_instances=False):
+        self.names = names # EventNames, may be shared with other traces
+        self.timestamps = array('q')
+        self.kinds = None
+        self.other_timestamps = [] # timestamps of kind OTHER_TIMESTAMP
+        self.event_ids = array('I')
+        self.values = []
+        self.instances = array('I') if with_instances else None
+
+    def append(self, timestamp, event_id, value, instance=None):
+        try:
+            self.timestamps.append(timestamp)
+            if self.kinds is not None:
+                self.kinds.append(INT_TIMESTAMP)
+        except (TypeError, OverflowError):
+            self.append_special_timestamp(timestamp)
+        self.event_ids.append(event_id)
+        self.values.append(value)
+        if self.instances is not None:
+            self.instances.append(instance)
+
+    # A timestamp that is not an int64, e.g., a float, or an int beyond 64 bits
+    def append_special_timestamp(self, timestamp):
+        if self.kinds is None:
+            self.kinds = bytearray(len(self.timestamps)) # all INT_TIMESTAMP
+        if isinstance(timestamp, float):
+            self.timestamps.append(INT64.unpack(FLOAT64.pack(timestamp))[0])
+            self.kinds.append(FLOAT_TIMESTAMP)
+        else:
+            self.timestamps.append(len(self.other_timestamps))
+            self.kinds.append(OTHER_TIMESTAMP)
+            self.other_timestamps.append(timestamp)
+
+    def decode_timestamp(self, timestamp, kind):
+        if kind == INT_TIMESTAMP:
+            return timestamp
+        if kind == FLOAT_TIMESTAMP:
+            return FLOAT64.unpack(INT64.pack(timestamp))[0]
+        return self.other_timestamps[timestamp]
+
+    def timestamp(self, i):
+        if self.kinds is None:
+            return self.timestamps[i]
+        return self.decode_timestamp(self.timestamps[i], self.kinds[i])
+
+    def iter_timestamps(self):
+        if self.kinds is None:
+            return iter(self.timestamps)
+        return map(self.decode_timestamp, self.timestamps, self.kinds)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, i):
+        if self.instances is None:
+            return (self.timestamp(i), self.names.names[self.event_ids[i]], self.values[i])
+        return (self.timestamp(i), self.instances[i], self.names.names[self.event_ids[i]], self.values[i])
+
+    def __iter__(self):
+        names = self.names.names
+        if self.instances is None:
+            return zip(self.iter_timestamps(), (names[i] for i in self.event_ids), self.values)
+        return zip(self.iter_timestamps(), self.instances, (names[i] for i in self.event_ids), self.values)
+
+    # Same list of tuples as recorded by Tracer/FleetTracer, e.g., for lib.test
+    def to_list(self):
+        return list(self)
+
+    # Zero-copy NumPy views of the columns (requires NumPy): {"timestamps": ..., ["kinds": ...], "event_ids": ..., ["instances": ...]}, and the values as a list.
+    # If there are kinds, only the timestamps of kind INT_TIMESTAMP are int64: those of kind FLOAT_TIMESTAMP are float64 (timestamps.view(numpy.float64)), those of kind OTHER_TIMESTAMP are indices in other_timestamps.
+    # The typed arrays cannot grow while views of them exist, so only take views of traces that are no longer recorded.
+    def numpy(self):
+        import numpy
+        views = {
+            "timestamps": numpy.frombuffer(self.timestamps, dtype=numpy.int64),
+            "event_ids": numpy.frombuffer(self.event_ids, dtype=numpy.uint32),
+        }
+        if self.kinds is not None:
+            views["kinds"] = numpy.frombuffer(self.kinds, dtype=numpy.uint8)
+        if self.instances is not None:
+            views["instances"] = numpy.frombuffer(self.instances, dtype=numpy.uint32)
+        return views, self.values
+
+    # Memory used by the typed arrays and the values list (not counting the value objects themselves)
+    def nbytes(self):
+        total = self.timestamps.itemsize * len(self.timestamps) + self.event_ids.itemsize * len(self.event_ids) + 8 * len(self.values) + 8 * len(self.other_timestamps)
+        if self.kinds is not None:
+            total += len(self.kinds)
+        if self.instances is not None:
+            total += self.instances.itemsize * len(self.instances)
+        return total
+
+# Kinds of timestamps in TraceColumns (like the kind of a record in lib/binary_trace.py)
+INT_TIMESTAMP = 0
+FLOAT_TIMESTAMP = 1 # the bits of the float64 are stored in the int64 column
+OTHER_TIMESTAMP = 2 # e.g., an int beyond 64 bits: the int64 column holds its index in TraceColumns.other_timestamps
+
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+
+# Interning table of event names: every name is stored once, and identified by a small integer
+class EventNames:
+    def __init__(self):
+        self.names = [] # ID -> name
+        self.ids = {} # name -> ID
+
+    def intern(self, name):
+        try:
+            return self.ids[name]
+        except KeyError:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+            return i
+
+# Same interface as Tracer, but with compact column-wise storage (see TraceColumns)
+class CompactTracer:
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.names = EventNames()
+        self.inputs = TraceColumns(self.names)
+        self.outputs = TraceColumns(self.names)
+        self.ignored = set() # IDs of timer events, which are not recorded (see Tracer.record_input_event)
+
+    # Interned ID of an input event name, or None if the event is not recorded
+    def input_event_id(self, event_name):
+        i = self.names.ids.get(event_name)
+        if i is None:
+            i = self.names.intern(event_name)
+            if event_name.startswith("__timer"):
+                self.ignored.add(i)
+        return None if i in self.ignored else i
+
+    def record_input_event(self, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, input event: {event_name}, value = {value}")
+        i = self.input_event_id(event_name)
+        if i is not None:
+            self.inputs.append(simtime, i, value)
+
+    def record_output_event(self, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, output event: {event_name}, value = {value}")
+        self.outputs.append(simtime, self.names.intern(event_name), value)
+
+    # See Tracer.output_event_sink
+    def output_event_sink(self, controller, names):
+        if self.verbose:
+            return OutputEventSink(controller, names, None, self.record_output_event).record_callback
+        return CompactOutputEventSink(controller, [self.names.intern(name) for name in names], self.outputs, None).record
+
+    # Lossless conversion to the lists of tuples of Tracer
+    @property
+    def input_events(self):
+        return self.inputs.to_list()
+
+    @property
+    def output_events(self):
+        return self.outputs.to_list()
+
+# Same interface as FleetTracer, but with compact column-wise storage (see TraceColumns)
+class CompactFleetTracer:
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.names = EventNames()
+        self.inputs = TraceColumns(self.names, with_instances=True)
+        self.outputs = TraceColumns(self.names, with_instances=True)
+
+    def record_input_event(self, instance, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, instance {instance}, input event: {event_name}, value = {value}")
+        self.inputs.append(simtime, self.names.intern(event_name), value, instance)
+
+    def record_output_event(self, instance, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, instance {instance}, output event: {event_name}, value = {value}")
+        self.outputs.append(simtime, self.names.intern(event_name), value, instance)
+
+    # See FleetTracer.output_event_sink
+    def output_event_sink(self, controller, names, instance):
+        if self.verbose:
+            return OutputEventSink(controller, names, instance, self.record_output_event).record_callback
+        return CompactOutputEventSink(controller, [self.names.intern(name) for name in names], self.outputs, instance).record
+
+    @property
+    def input_events(self):
+        return self.inputs.to_list()
+
+    @property
+    def output_events(self):
+        return self.outputs.to_list()
 
+    # Get the trace of a single instance, in the same format as Tracer.input_events/output_events
+    def instance_trace(self, trace, instance):
+        return FleetTracer.instance_trace(self, trace, instance)
+
+class CompactOutputEventSink:
+    __slots__ = ('controller', 'ids', 'columns', 'instance')
+
+    # ids: event ID of the OutputEventRegistry -> interned event ID
+    def __init__(self, controller, ids, columns, instance):
+        self.controller = controller
+        self.ids = ids
+        self.columns = columns
+        self.instance = instance
+
+    def record(self, event_id, value=None):
+        self.columns.append(self.controller.simulated_time, self.ids[event_id], value, self.instance)
+
+
+# Both formatters build a list of lines and join it once at the end, which (unlike repeated string concatenation) is guaranteed to take linear time, also for very long traces.
 def format_trace_as_python_code(trace, indent=0):
-    txt = "[\n"
-    for (timestamp, event_name, value) in trace:
-        txt += (" "*indent)+"    (%i, \"%s\", %s),\n" % (timestamp, event_name, value)
-    txt += (" "*indent)+"],"
-    return txt
+    prefix = " "*indent
+    lines = ["["]
+    lines.extend(prefix+"    (%i, \"%s\", %s)," % (timestamp, event_name, value) for (timestamp, event_name, value) in trace)
+    lines.append(prefix+"],")
+    return "\n".join(lines)
 
 # almost same as Python, but with arrays instead of tuples
 def format_trace_as_json(trace, indent=0):
-    txt = "[\n"
-    for (timestamp, event_name, value) in trace:
-        txt += (" "*indent)+"    [%i, \"%s\", %s],\n" % (timestamp, event_name, value)
-    txt += (" "*indent)+"],"
-    return txt
+    prefix = " "*indent
+    lines = ["["]
+    lines.extend(prefix+"    [%i, \"%s\", %s]," % (timestamp, event_name, value) for (timestamp, event_name, value) in trace)
+    lines.append(prefix+"],")
+    return "\n".join(lines)
+
+# Reads a trace in JSON-lines format: one [timestamp, "event_name", value] array per line.
+# Lazily yields (timestamp, event_name, value)-tuples, so it can be passed to Controller.add_input_stream to replay traces that do not fit in memory.
+# A truncated last line (from a process that was killed while writing, see StreamingTracer) is ignored.
+def read_trace_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    (timestamp, event_name, value) = json.loads(line)
+                except ValueError:
+                    if line.endswith("\n"):
+                        raise
+                    return
+                yield (timestamp, event_name, value)
+
+# Writes a trace in JSON-lines format (see read_trace_jsonl), one event at a time.
+class JsonLinesTraceWriter:
+    def __init__(self, path, buffer_size=1 << 16):
+        self.file = open(path, 'w', buffering=buffer_size)
+        self.names = {} # event name -> event name as JSON string
+
+    def write(self, timestamp, event_name, value=None):
+        try:
+            name = self.names[event_name]
+        except KeyError:
+            name = self.names[event_name] = json.dumps(event_name)
+        self.file.write("[%s, %s, %s]\n" % (timestamp, name, "null" if value is None else json.dumps(value)))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Records input/output events like Tracer, but instead of keeping them in memory, writes them to files while the simulation runs:
+#   <path>.input.jsonl and <path>.output.jsonl (or .bin, in the format of lib/binary_trace.py)
+# Memory usage stays flat, and if the process crashes or gets killed, everything up to the last flush is in the files. The input file can be replayed as-is with Controller.add_input_stream.
+# flush_every: flush after this many events (per file)
+# flush_interval: also flush when this many seconds (wall-clock time) have passed since the last flush
+# background: format and write the events in a background thread, which flushes every flush_interval seconds. The simulation only puts the events in a queue.
+# Cannot be snapshotted (see lib/snapshot.py), because of the open files.
+class StreamingTracer:
+    def __init__(self, path, binary=False, flush_every=1000, flush_interval=1.0, background=False, verbose=False):
+        self.verbose = verbose
+        extension = '.bin' if binary else '.jsonl'
+        self.input_path = path + '.input' + extension
+        self.output_path = path + '.output' + extension
+        if binary:
+            # Statecharts have few event names: 4 KB keeps the files readable after every flush
+            writers = [BinaryTraceWriter(p, names_capacity=4096) for p in (self.input_path, self.output_path)]
+        else:
+            writers = [JsonLinesTraceWriter(p) for p in (self.input_path, self.output_path)]
+        if background:
+            self.inputs, self.outputs = streams = [BackgroundTraceStream(w) for w in writers]
+            self.thread = threading.Thread(target=self.run_background, args=(streams, flush_interval), daemon=True)
+            self.stop = threading.Event()
+            self.thread.start()
+        else:
+            self.inputs, self.outputs = [TraceStream(w, flush_every, flush_interval) for w in writers]
+            self.thread = None
+
+    def record_input_event(self, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, input event: {event_name}, value = {value}")
+        if not event_name.startswith("__timer"):
+            self.inputs.append( (simtime, event_name, value) )
+
+    def record_output_event(self, simtime, event_name, value):
+        if self.verbose:
+            print(f"time = {pretty_time(simtime)}, output event: {event_name}, value = {value}")
+        self.outputs.append( (simtime, event_name, value) )
+
+    # Same as Tracer.output_event_sink
+    def output_event_sink(self, controller, names):
+        if self.verbose:
+            return OutputEventSink(controller, names, None, self.record_output_event).record_callback
+        return OutputEventSink(controller, names, None, self.outputs).record
+
+    def run_background(self, streams, flush_interval):
+        while not self.stop.wait(flush_interval):
+            for stream in streams:
+                stream.drain()
+        for stream in streams:
+            stream.drain()
+
+    def flush(self):
+        if self.thread is None:
+            self.inputs.flush()
+            self.outputs.flush()
+
+    # Writes all remaining events, and closes the files. Safe to call more than once.
+    def close(self):
+        if self.thread is not None:
+            self.stop.set()
+            self.thread.join()
+        self.inputs.close()
+        self.outputs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+# Writes events to a trace writer (JsonLinesTraceWriter or lib.binary_trace.BinaryTraceWriter), flushing according to StreamingTracer's flush policy
+class TraceStream:
+    def __init__(self, writer, flush_every, flush_interval):
+        self.writer = writer
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def append(self, event):
+        (timestamp, event_name, value) = event
+        self.writer.write(timestamp, event_name, value)
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.writer.flush()
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.unflushed:
+            self.flush()
+        self.writer.close()
+
+# Same, but written by StreamingTracer's background thread. The simulation thread only appends to a deque (thread-safe, no locks needed).
+class BackgroundTraceStream:
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = deque()
+        self.append = self.queue.append
+
+    def drain(self):
+        popleft = self.queue.popleft
+        write = self.writer.write
+        written = False
+        while self.queue:
+            (timestamp, event_name, value) = popleft()
+            write(timestamp, event_name, value)
+            written = True
+        if written:
+            self.writer.flush()
+
+    def close(self):
+        self.drain()
+        self.writer.close()
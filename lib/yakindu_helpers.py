@@ -1,7 +1,11 @@
 # In this module, stuff that is specific to Yakindu's generated code
 # Author: Joeri Exelmans
 
-from lib.controller import Controller, pretty_time
+from lib.controller import Controller, InputEventRegistry, pretty_time
+
+from collections import deque
+from functools import partial
+from operator import not_
 
 # for some stupid reason, we have to import the 'Observable' class like this, or `type(obj) == Observable` will fail:
 import sys, os
@@ -31,17 +35,136 @@ class YakinduTimerServiceAdapter:
 
     def unset_timer(self, _, event_id):
         try:
-            e = self.timers[event_id]
-            e.canceled = True
+            e = self.timers.pop(event_id)
+            self.controller.cancel(e)
         except KeyError:
             pass
 
 
+# Same as YakinduTimerServiceAdapter, but shared by many statechart instances (see lib/fleet.py), instead of one adapter object per instance.
+# Every instance has its own timer namespace: timers are identified by (statechart instance, event_id).
+class FleetTimerService:
+    def __init__(self, controller: Controller):
+        self.controller = controller
+        self.timers = {}
+
+    # Duration: milliseconds
+    def set_timer(self, sc, event_id, duration, periodic):
+        self.unset_timer(sc, event_id)
+        self.timers[(sc, event_id)] = self.controller.add_input_lowlevel(
+            self.controller.simulated_time + duration * 1000000, # ms to ns
+            raise_method=sc.time_elapsed,
+            value=event_id,
+            event_name="__timer"+str(event_id))
+
+    def unset_timer(self, sc, event_id):
+        e = self.timers.pop((sc, event_id), None)
+        if e is not None:
+            self.controller.cancel(e)
+
+
+# Fast-path runtime for the generated code, for single-threaded simulation (which is always the case when the statechart is driven by a Controller).
+#
+# The generated raise methods put a closure in a (locked) queue.Queue, and then call run_cycle, which gets it from the queue again.
+# After enable_fast_path(sc), the public API of 'sc' is unchanged, but:
+#   - its internal event queue is an unlocked deque
+#   - raise methods (and time_elapsed) directly execute the event's raise callback and then call run_cycle, without going through the queue at all
+#     (only events raised during a run-to-completion step, e.g., from an output event observer, still need to be queued)
+def enable_fast_path(sc):
+    if getattr(sc, 'interpreted', False):
+        # Statecharts loaded by lib/interpreter.py have no locks to begin with
+        return
+    sc.in_event_queue = UnlockedEventQueue()
+    cls = type(sc).__name__
+    is_executing_attr = f"_{cls}__is_executing"
+    for (interface, method_name) in InputEventRegistry.of(sc).paths:
+        obj = sc if interface is None else getattr(sc, interface)
+        # The generated code has a private callback method for every raise method, e.g., raise_stop -> __raise_stop_call
+        callback_name = f"_{type(obj).__name__}__{method_name}_call"
+        # Instance attributes take precedence over methods of the class:
+        setattr(obj, method_name, FastRaiseMethod(sc, is_executing_attr, obj, callback_name))
+    num_time_events = len(getattr(sc, f"_{cls}__time_events"))
+    sc.time_elapsed = FastTimeElapsed(sc, is_executing_attr, num_time_events)
+
+# A deque with the interface of queue.Queue, as far as the generated code is concerned - without the locks.
+class UnlockedEventQueue:
+    __slots__ = ('queue', 'put', 'get', 'empty')
+
+    def __init__(self):
+        self.queue = deque()
+        # Bind C-implemented functions, no Python method calls needed:
+        self.put = self.queue.append
+        self.get = self.queue.popleft
+        self.empty = partial(not_, self.queue)
+
+    # Only the contents need to be pickled (see lib/snapshot.py)
+    def __getstate__(self):
+        return list(self.queue)
+
+    def __setstate__(self, items):
+        self.__init__()
+        self.queue.extend(items)
+
+# Replaces a generated raise method
+# A class instead of a closure, so that statecharts using the fast path can still be snapshotted (see lib/snapshot.py)
+class FastRaiseMethod:
+    __slots__ = ('sc', 'is_executing_attr', 'obj', 'callback_name', 'callback')
+
+    def __init__(self, sc, is_executing_attr, obj, callback_name):
+        self.sc = sc
+        self.is_executing_attr = is_executing_attr
+        self.obj = obj
+        self.callback_name = callback_name
+        self.callback = getattr(obj, callback_name)
+
+    # Bound methods with a private (name-mangled) name cannot be pickled, so we re-resolve the callback instead:
+    def __getstate__(self):
+        return (self.sc, self.is_executing_attr, self.obj, self.callback_name)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __call__(self, *value):
+        sc = self.sc
+        if getattr(sc, self.is_executing_attr):
+            # Raised during a run-to-completion step: queue it, just like the generated code
+            sc.in_event_queue.put(partial(self.callback, *value))
+        elif sc.in_event_queue.queue:
+            # Not executing, but events are still queued (e.g., raised by an output observer during enter): they must be handled first, just like in the generated code
+            sc.in_event_queue.put(partial(self.callback, *value))
+            sc.run_cycle()
+        else:
+            # Not executing and the queue is empty: the generated run_cycle would immediately get and execute our callback
+            self.callback(*value)
+            sc.run_cycle()
+
+class FastTimeElapsed:
+    __slots__ = ('sc', 'is_executing_attr', 'num_time_events')
+
+    def __init__(self, sc, is_executing_attr, num_time_events):
+        self.sc = sc
+        self.is_executing_attr = is_executing_attr
+        self.num_time_events = num_time_events
+
+    def __call__(self, event_id):
+        if 0 <= event_id < self.num_time_events:
+            sc = self.sc
+            if getattr(sc, self.is_executing_attr):
+                sc.in_event_queue.put(partial(sc.raise_time_event, event_id))
+            elif sc.in_event_queue.queue:
+                sc.in_event_queue.put(partial(sc.raise_time_event, event_id))
+                sc.run_cycle()
+            else:
+                sc.raise_time_event(event_id)
+                sc.run_cycle()
+
+
 # Could not find a better way to get list of output events of a YAKINDU statechart
+# (see OutputEventRegistry for a way that only needs to look once per statechart class)
 def iter_output_observables(sc):
     for attr in dir(sc):
         obj = getattr(sc, attr)
-        if type(obj) == Observable:
+        if isinstance(obj, Observable):
             yield (attr[0:-11], obj)
 
 
@@ -56,12 +179,132 @@ class OutputEventTracer(Observer):
         self.callback(self.controller.simulated_time, self.event_name, value)
 
 def trace_output_events(controller, sc, callback, iface=None):
-    for event_name, observable in iter_output_observables(getattr(sc, iface)):
-        if iface == None:
-            full_event_name = event_name
-        else:
-            full_event_name = iface + '.' + event_name
-        observable.subscribe(OutputEventTracer(controller, full_event_name, callback))
+    registry = OutputEventRegistry.of(sc)
+    for (interface, _), event_name, observable in zip(registry.paths, registry.names, registry.bind(sc)):
+        if interface == iface:
+            observable.subscribe(OutputEventTracer(controller, event_name, callback))
+
+# Same as trace_output_events, but for the output events of all interfaces at once, through a single sink (see OutputEventMultiplexer).
+# Cheaper to set up. Tracers from lib/tracer.py have their own sink (e.g., Tracer.output_event_sink), which is also cheaper per output event.
+def trace_all_output_events(controller, sc, callback):
+    registry = OutputEventRegistry.of(sc)
+    OutputEventMultiplexer.of(sc).subscribe(OutputEventTracerSink(controller, registry.names, callback).record)
+
+
+# Registry of the output events of a statechart class, built once per class (the output counterpart of lib.controller.InputEventRegistry).
+# Maps every output event name (e.g., 'crane_control.move') to a compact integer ID.
+# Output events are discovered through the generated code's convention: an Observable attribute '<event>_observable', either on the statechart itself or on one of its interface objects.
+class OutputEventRegistry:
+    registries = {} # statechart class -> OutputEventRegistry
+
+    # Get the registry of the class of 'sc', creating it the first time
+    @staticmethod
+    def of(sc):
+        try:
+            return OutputEventRegistry.registries[type(sc)]
+        except KeyError:
+            registry = OutputEventRegistry.registries[type(sc)] = OutputEventRegistry(sc)
+            return registry
+
+    def __init__(self, sc):
+        self.names = [] # event ID -> event name
+        self.paths = [] # event ID -> (interface attribute name or None, observable attribute name)
+        self.ids = {} # event name -> event ID
+        for attr in observable_attrs(sc):
+            self.register(None, attr)
+        for interface, obj in vars(sc).items():
+            if not interface.startswith('_'):
+                for attr in observable_attrs(obj):
+                    self.register(interface, attr)
+
+    def register(self, interface, attr):
+        short_event_name = attr[:-len('_observable')]
+        event_name = short_event_name if interface is None else interface + '.' + short_event_name
+        self.ids[event_name] = len(self.names)
+        self.names.append(event_name)
+        self.paths.append((interface, attr))
+
+    # Resolve all output events for a particular statechart instance
+    # Returns list: event ID -> Observable
+    def bind(self, sc):
+        return [getattr(sc if interface is None else getattr(sc, interface), attr) for (interface, attr) in self.paths]
+
+def observable_attrs(obj):
+    # Not every public attribute is an interface object, e.g., constants:
+    return [attr for attr, value in getattr(obj, '__dict__', {}).items() if attr.endswith('_observable') and isinstance(value, Observable)]
+
+
+# A single point to subscribe to all output events of a statechart instance: every sink is called as sink(event_id, value) for every output event, with event IDs from the OutputEventRegistry.
+# Intended for tracers, GUIs and network bridges, that are interested in all output events anyway.
+# Sinks are called before the observers of the individual output events.
+class OutputEventMultiplexer:
+    # Get the multiplexer of 'sc', creating it the first time
+    @staticmethod
+    def of(sc):
+        try:
+            return sc._output_event_multiplexer
+        except AttributeError:
+            multiplexer = sc._output_event_multiplexer = OutputEventMultiplexer(sc)
+            return multiplexer
+
+    def __init__(self, sc):
+        self.sinks = []
+        # The observables of the generated code are replaced by MultiplexedObservables, keeping their observers:
+        self.observables = []
+        for event_id, (interface, attr) in enumerate(OutputEventRegistry.of(sc).paths):
+            obj = sc if interface is None else getattr(sc, interface)
+            observable = MultiplexedObservable(getattr(obj, attr), self.sinks, event_id)
+            setattr(obj, attr, observable)
+            self.observables.append(observable)
+
+    def subscribe(self, sink):
+        self.sinks.append(sink)
+        for observable in self.observables:
+            observable.update()
+
+    def unsubscribe(self, sink):
+        self.sinks.remove(sink)
+        for observable in self.observables:
+            observable.update()
+
+class MultiplexedObservable(Observable):
+    def __init__(self, observable, sinks, event_id):
+        self.observers = observable.observers
+        self.sinks = sinks # shared with the OutputEventMultiplexer
+        self.event_id = event_id
+
+    def next(self, value=None):
+        for sink in self.sinks:
+            sink(self.event_id, value)
+        Observable.next(self, value)
+
+    # Choose the cheapest way to dispatch: in the common case of a single sink and no observers, an instance attribute 'next' (which takes precedence over the method) calls the sink directly, without any Python code in between.
+    def update(self):
+        self.__dict__.pop('next', None)
+        if len(self.sinks) == 1 and not self.observers:
+            self.next = partial(self.sinks[0], self.event_id)
+
+    def subscribe(self, observer):
+        result = Observable.subscribe(self, observer)
+        self.update()
+        return result
+
+    def unsubscribe(self, observer):
+        result = Observable.unsubscribe(self, observer)
+        self.update()
+        return result
+
+# Its 'record' method is a sink for an OutputEventMultiplexer, calling callback(simulated_time, event_name, value) like OutputEventTracer
+class OutputEventTracerSink:
+    __slots__ = ('controller', 'names', 'callback')
+
+    def __init__(self, controller, names, callback):
+        self.controller = controller
+        self.names = names # event ID -> event name
+        self.callback = callback
+
+    def record(self, event_id, value=None):
+        self.callback(self.controller.simulated_time, self.names[event_id], value)
 
 
 # Allows use of a simple callback to respond to an output event
@@ -4,7 +4,7 @@
 from common import setup, setup_fake_scheduler, setup_fake_crane_control
 
 if __name__ == "__main__":
-    controller, sc, _ = setup()
+    controller, sc, _ = setup(fast_path=True)
 
     setup_fake_scheduler(controller, sc, move_status_callback=print)
     setup_fake_crane_control(controller, sc, crane_status_callback=print)
@@ -0,0 +1,31 @@
+# Runs a fleet of cranes (one Statechart instance per crane) as-fast-as-possible, headless, on a single Controller.
+#
+# The number of cranes can be passed as a parameter, e.g.:
+#   python runner_fleet.py 1000
+
+import sys
+import time
+
+from common import setup_fleet, setup_fake_scheduler, setup_fake_crane_control
+
+if __name__ == "__main__":
+    try:
+        size = int(sys.argv[1])
+    except:
+        size = 100
+    print(f"FLEET SIZE is {size}")
+
+    controller, fleet, tracer = setup_fleet(size)
+
+    for sc in fleet.instances:
+        setup_fake_scheduler(controller, sc, move_status_callback=lambda msg: None)
+        setup_fake_crane_control(controller, sc, crane_status_callback=lambda msg: None)
+
+    start = time.perf_counter()
+    fleet.enter() # enter default state(s) of all cranes
+
+    # Blocking synchronous call:
+    controller.run_until(float('inf'))
+
+    duration = time.perf_counter() - start
+    print(f"Simulated {size} cranes in {duration:.3f} s: {len(tracer.input_events)} input events, {len(tracer.output_events)} output events.")
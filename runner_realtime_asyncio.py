@@ -0,0 +1,38 @@
+# Headless real-time simulation, in an asyncio event loop.
+# Also shows how a coroutine (e.g., a network bridge) interacts with the simulation: it presses the emergency stop after a while, and waits for the crane to stop.
+
+from common import setup, setup_fake_scheduler, setup_fake_crane_control, setup_wall_clock
+from lib.realtime.asyncio_event_loop import AsyncioRealTimeSimulation
+
+import asyncio
+
+async def press_emergency_stop(sim, sc, wall_clock):
+    await asyncio.sleep(2 / wall_clock.time_scale) # 2 s of simulated time
+    stopped = sim.wait_for_output(sc, 'crane_control.stop_all_movement')
+    sim.add_input_now(sc, 'emergency.stop')
+    try:
+        await asyncio.wait_for(stopped, timeout=1)
+        print("crane stopped")
+    except asyncio.TimeoutError:
+        print("crane did not stop within 1 s")
+    sim.add_input_now(sc, 'emergency.resume')
+
+async def main():
+    controller, sc, _ = setup()
+    sched = setup_fake_scheduler(controller, sc, move_status_callback=print)
+    setup_fake_crane_control(controller, sc, crane_status_callback=print)
+    wall_clock = setup_wall_clock()
+
+    # Real-time simulation...
+    sim = AsyncioRealTimeSimulation(controller, wall_clock,
+        # because the headless simulation is non-interactive, we specify a termination condition:
+        termination_condition=sched.termination_condition)
+
+    wall_clock.record_start_time() # start_time is NOW!
+    sc.enter() # enter default state(s)
+    sim.poke() # schedule the first wakeup
+    asyncio.get_running_loop().create_task(press_emergency_stop(sim, sc, wall_clock))
+    await sim.terminated()
+
+if __name__ == "__main__":
+    asyncio.run(main())
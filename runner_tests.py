@@ -1,5 +1,8 @@
 import functools
-from lib.test import run_scenario
+import os
+import sys
+import time
+from lib.test import run_scenarios, ScenarioResultCache
 from common import setup
 
 # For each test scenario, sends a sequence of timed input events to the statechart, and checks if the expected sequence of timed output events occurs.
@@ -109,12 +112,49 @@ INITIAL = [
     # ("crane_control.move", 0), # initially at position 0
 ]
 
+# Everything that determines the outcome of a scenario, besides the scenario itself (see ScenarioResultCache in lib/test.py):
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODE_PATHS = [os.path.join(HERE, path) for path in ["srcgen/statechart.py", "lib", "common.py", "Statechart.ysc", "Statechart.sgen"]]
+
+# Usage:
+#   python runner_tests.py              runs all scenarios, one after the other
+#   python runner_tests.py -j [N]       runs scenarios in parallel, in N worker processes (default: number of CPU cores)
+# Add --interpreted to test Statechart.ysc directly, instead of the generated code.
+# Add --diff to always print the full diff of failed scenarios (by default, only for short traces).
+# Results are cached in __pycache__/scenario_results/: a scenario only runs again if it changed, or the code under test (see CODE_PATHS). Add --force to run all scenarios anyway.
 if __name__ == "__main__":
-    s = functools.partial(setup, print_trace_at_the_end=False)
+    interpreted = "--interpreted" in sys.argv
+    full_diff = True if "--diff" in sys.argv else None
+    force = "--force" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in ("--interpreted", "--diff", "--force")]
+    s = functools.partial(setup, print_trace_at_the_end=False, fast_path=True, interpreted=interpreted)
+    cache = ScenarioResultCache(os.path.join(HERE, "__pycache__", "scenario_results"), CODE_PATHS, settings=s.keywords)
     ok = True
-    for scenario in SCENARIOS:
-        print(f"Running scenario: {scenario["name"]}")
-        ok = run_scenario(scenario["input_events"], scenario["output_events"], s, INITIAL, IDEMPOTENT, verbose=False) and ok
+    if len(args) > 0 and args[0] == "-j":
+        processes = int(args[1]) if len(args) > 1 else None
+        start = time.perf_counter()
+        results = run_scenarios(SCENARIOS, s, INITIAL, IDEMPOTENT, processes, full_diff=full_diff, cache=cache, force=force)
+        for result in results:
+            print(f"Running scenario: {result['name']}")
+            # only show full output (trace + diff) of failed scenarios:
+            if not result["ok"]:
+                print(result["output"], end='')
+            ok = result["ok"] and ok
+        print("Results:")
+        for result in results:
+            print(f"  {'PASS' if result['ok'] else 'FAIL'}  {result['duration']:8.3f} s  {result['name']}{' (cached)' if result['cached'] else ''}")
+        print(f"Ran {len(results)} scenarios in {time.perf_counter() - start:.3f} s.")
+    else:
+        results = []
+        for scenario in SCENARIOS:
+            print(f"Running scenario: {scenario['name']}")
+            [result] = run_scenarios([scenario], s, INITIAL, IDEMPOTENT, full_diff=full_diff, cache=cache, force=force)
+            print(result["output"], end='')
+            results.append(result)
+            ok = result["ok"] and ok
+    cached = sum(1 for result in results if result["cached"])
+    if cached:
+        print(f"{cached} of {len(results)} results were cached (run with --force to run all scenarios again).")
     if ok:
         print("All scenarios passed.")
     else: